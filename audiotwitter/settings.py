@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     "comments.apps.CommentsConfig",
     "followers.apps.FollowersConfig",
     "tags.apps.TagsConfig",
+    "uploads.apps.UploadsConfig",
     "django.contrib.admin",
     "django.contrib.auth",
     "django.contrib.contenttypes",
@@ -205,7 +206,7 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         },
-        "CAHCE_TIMEOUT": 60 * 60 * 24 * 7,
+        "TIMEOUT": 60 * 60 * 24 * 7,
     },
     "second": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -213,13 +214,161 @@ CACHES = {
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
         },
-        "CAHCE_TIMEOUT": 60 * 60 * 24 * 7,
+        "TIMEOUT": 60 * 60 * 24 * 7,
+    },
+    "stt": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "stt_cache",
+        "TIMEOUT": None,
+        "OPTIONS": {
+            "MAX_ENTRIES": 10000,
+        },
     },
 }
 
+STT_ENGINE = {
+    "BACKEND": "core.engines.WhisperEngine",
+    "OPTIONS": {
+        "model": "small",
+        "quantize": False,
+    },
+}
+# STT_ENGINE = {
+#     "BACKEND": "core.engines.FasterWhisperEngine",
+#     "OPTIONS": {
+#         "model": "small",
+#         "compute_type": "int8",
+#     },
+# }
+
+# Energy based silence trimming applied before transcription.
+STT_VAD = {
+    "THRESHOLD_DB": -35,
+    "MIN_SILENCE_MS": 500,
+    "PADDING_MS": 200,
+}
+
+# Noun extraction for tags. MecabExtractor avoids the JVM that Okt needs;
+# SimpleExtractor avoids native code too but only approximates Okt's tags.
+# Repeated sentences are answered from an LRU cache.
+STT_NOUNS = {
+    "BACKEND": "core.nouns.OktExtractor",
+    "OPTIONS": {
+        "pool_size": 4,
+    },
+    "CACHE_SIZE": 4096,
+}
+
+# Long babbles are split at silences and transcribed on a process pool,
+# forked by each worker once its models are loaded.
+STT_CHUNK_SECONDS = 30
+STT_CHUNK_WORKERS = 4
+
+# Sentiment requests from concurrent jobs are run as one batch.
+STT_SENTIMENT_BATCH = {
+    "MAX_SIZE": 16,
+    "MAX_WAIT_MS": 10,
+}
+
+STT_QUEUE = {
+    "BACKEND": "core.queues.SQLiteQueue",
+    "LOCATION": BASE_DIR / "stt_queue.sqlite3",
+}
+# STT_QUEUE = {
+#     "BACKEND": "core.queues.RedisQueue",
+#     "LOCATION": "default",
+# }
+STT_WORKERS = 2
+STT_WORKER_THREADS = 4
+STT_PRELOAD = False
+STT_CONCURRENCY = 2
+STT_MAX_WAITING = 16
+STT_WAIT_TIMEOUT = 60
+STT_QUEUE_MAX = 200
+# A popped job is leased for STT_JOB_LEASE seconds, longer than any
+# transcription takes; if its worker dies it is requeued after that, and
+# its babble failed after STT_MAX_ATTEMPTS leases.
+STT_JOB_LEASE = 60 * 15
+STT_MAX_ATTEMPTS = 3
+STT_RETRY_AFTER = 30
+# Clips up to STT_SHORT_SECONDS jump ahead of long clips and edits, which in
+# turn are delayed by at most STT_PRIORITY_AGING seconds per priority class.
+STT_SHORT_SECONDS = 30
+STT_PRIORITY_AGING = 60
+
+# Cache key namespaces. Bump a keyspace's version when the format of its
+# cached values changes incompatibly; deploys that keep the versions keep
+# the warm cache. After bumping "timeline" or "outbox", run warm_timelines
+# before the traffic shift and "warm_timelines --cutover" after it.
+CACHE_VERSIONS = {
+    "timeline": 1,
+    "outbox": 1,
+    "babble": 2,
+}
+
+# Home timelines keep the newest TIMELINE_SIZE babble ids per user in Redis.
+# A rebuilt timeline lives TIMELINE_COLD_TIMEOUT seconds; every read extends
+# it, and its flags, to TIMELINE_TIMEOUT so active users keep theirs.
+TIMELINE_SIZE = 30
+TIMELINE_TIMEOUT = 60 * 60 * 24 * 7
+TIMELINE_COLD_TIMEOUT = 60 * 60
+# Follower timelines updated per server-side script call during fan-out.
+TIMELINE_FANOUT_CHUNK = 500
+# Authors with at least this many followers are not fanned out; their
+# outbox is merged into their followers' feeds at read time.
+FEED_PULL_THRESHOLD = 10000
+
+# Cached babbles live BABBLE_TIMEOUT seconds. Each read from Redis extends
+# a babble to BABBLE_TIMEOUT x (reads + 1), up to BABBLE_MAX_TIMEOUT.
+BABBLE_TIMEOUT = 60 * 5
+BABBLE_MAX_TIMEOUT = 60 * 60 * 24
+
+# Cap on the Redis server's memory, applied by "cache_report --apply".
+# volatile-lfu only evicts keys with a TTL, the least used first: cached
+# timelines and babbles, never pending counts.
+CACHE_MAXMEMORY = "1gb"
+CACHE_EVICTION_POLICY = "volatile-lfu"
+
+# Recently read babbles are also kept in each process, at most MAX_SIZE of
+# them for TIMEOUT seconds; changes are broadcast over Redis pub/sub.
+BABBLE_LOCAL_CACHE = {
+    "MAX_SIZE": 1000,
+    "TIMEOUT": 5,
+}
+
+# Cache misses are rebuilt by one request at a time; the others wait up to
+# WAIT seconds for it. LOCK_TIMEOUT frees the lock of a crashed rebuild.
+# BETA above 1 refreshes entries earlier before they expire.
+CACHE_REBUILD = {
+    "LOCK_TIMEOUT": 5,
+    "WAIT": 0.5,
+    "BETA": 1.0,
+}
+
+# Like, rebabble and comment counts are kept in Redis and written to the
+# babble rows every COUNTER_FLUSH_INTERVAL seconds by flush_counters. A batch
+# claimed by a flusher that has not finished after COUNTER_CLAIM_TIMEOUT
+# seconds is written by the next flush.
+COUNTER_FLUSH_INTERVAL = 10
+COUNTER_FLUSH_BATCH = 500
+COUNTER_CLAIM_TIMEOUT = 60
+
+# Chunked uploads: the largest file a client may declare.
+UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+
+# Transcription workers send "tags are ready" notifications from their own
+# processes. The in-memory layer only reaches sockets of the same process,
+# so those arrive only as Notification rows; deploy with the Redis layer
+# (channels_redis) to push them live.
 CHANNEL_LAYERS = {
     "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
 }
+# CHANNEL_LAYERS = {
+#     "default": {
+#         "BACKEND": "channels_redis.core.RedisChannelLayer",
+#         "CONFIG": {"hosts": [("localhost", 6379)]},
+#     },
+# }
 
 if DEBUG:
     MIDDLEWARE += [
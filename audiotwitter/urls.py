@@ -33,6 +33,7 @@ from likes.views import LikeViewSet
 from notifications.views import NotificationViewSet
 from rebabbles.views import RebabbleViewSet
 from tags.views import TagViewSet
+from uploads.views import UploadViewSet
 from users.views import UserViewSet
 
 router = DefaultRouter(trailing_slash=False)
@@ -44,6 +45,7 @@ router.register(
 )
 router.register(r"auth", AuthViewSet, basename="auth")
 router.register(r"tags", TagViewSet, basename="tags")
+router.register(r"uploads", UploadViewSet, basename="uploads")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -0,0 +1,363 @@
+# Serialized babbles: "babble:v<n>:<id>" is a hash with the JSON encoded babble
+# under "data" and each count in its own integer field. Flushed counts drop
+# the entry rather than change it in place: a rebuild that raced the flush
+# would already hold them. A flush also bumps the babble's
+# "babble:v<n>:<id>:generation", and a rebuild only stores its copy if the
+# generation is the one it saw before reading the database, so one that
+# read the counts from before the flush cannot outlive it.
+#
+# Each process keeps recently read babbles in a small LRU in front of Redis.
+# Every write publishes the changed ids on CHANNEL and all processes drop
+# their copies; entries also expire after a few seconds in case a message
+# is missed while a subscriber reconnects.
+#
+# Missing babbles are rebuilt by one caller at a time (see core.singleflight)
+# and entries close to expiring are refreshed early by a random caller.
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django_redis import get_redis_connection
+
+from core import singleflight
+from core.cachestats import KeyspaceStats
+from core.localcache import LocalCache
+from core.namespaces import namespace
+
+logger = logging.getLogger(__name__)
+
+COUNTS = ("like_count", "comment_count", "rebabble_count")
+CHANNEL = "babble_cache:invalidate"
+
+keyspace_stats = KeyspaceStats()
+
+
+def get_connection():
+    return get_redis_connection("second")
+
+
+def babble_key(babble_id: int) -> str:
+    return f"{namespace('babble')}:{babble_id}"
+
+
+def generation_key(babble_id: int) -> str:
+    return f"{babble_key(babble_id)}:generation"
+
+
+# Counts a read of each babble in KEYS and extends its TTL to ARGV[1] x
+# (reads + 1) seconds, at most ARGV[2]: popular babbles stay, cold ones
+# expire after ARGV[1].
+TOUCH_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then
+        local reads = redis.call("HINCRBY", key, "reads", 1)
+        local ttl = math.min(tonumber(ARGV[2]), tonumber(ARGV[1]) * (reads + 1))
+        if redis.call("TTL", key) < ttl then
+            redis.call("EXPIRE", key, ttl)
+        end
+    end
+end
+return 0
+"""
+
+
+# Caches a babble's fields, ARGV[3..], under KEYS[1] for ARGV[2] seconds
+# unless its generation, KEYS[2], has moved on from ARGV[1].
+SET_SCRIPT = """
+if (redis.call("GET", KEYS[2]) or "0") ~= ARGV[1] then
+    return 0
+end
+redis.call("DEL", KEYS[1])
+redis.call("HSET", KEYS[1], unpack(ARGV, 3))
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+return 1
+"""
+
+
+def encode(data: Dict) -> Dict[str, str]:
+    fields = {count: data.get(count) or 0 for count in COUNTS}
+    rest = {key: value for key, value in data.items() if key not in COUNTS}
+    fields["data"] = json.dumps(rest, cls=DjangoJSONEncoder)
+    return fields
+
+
+def decode(fields: Dict[bytes, bytes]) -> Optional[Dict]:
+    if b"data" not in fields:
+        return None
+
+    data = json.loads(fields[b"data"])
+    for count in COUNTS:
+        data[count] = int(fields.get(count.encode(), 0))
+    return data
+
+
+class LocalTier:
+    """This process's LRU of babbles and the thread that empties it when
+    other processes publish changes. Both are rebuilt after a fork."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.cache: Optional[LocalCache] = None
+        self.redis_hits = 0
+        self.redis_misses = 0
+
+    def get_cache(self) -> LocalCache:
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.cache = LocalCache(
+                    settings.BABBLE_LOCAL_CACHE["MAX_SIZE"],
+                    settings.BABBLE_LOCAL_CACHE["TIMEOUT"],
+                )
+                self.redis_hits = self.redis_misses = 0
+                self.subscribe()
+
+        return self.cache
+
+    def subscribe(self) -> None:
+        pubsub = get_connection().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{CHANNEL: self.on_message})
+        pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self.on_error)
+
+    def on_message(self, message: Dict) -> None:
+        babble_ids = json.loads(message["data"])
+        if babble_ids is None:
+            self.cache.clear()
+        else:
+            self.cache.delete_many(babble_ids)
+
+    def on_error(self, error: Exception, pubsub: Any, thread: Any) -> None:
+        # Whatever was published meanwhile is lost; start over.
+        logger.warning({"channel": CHANNEL, "error": repr(error)})
+        self.cache.clear()
+        time.sleep(1)
+
+    def count(self, hits: int, misses: int) -> None:
+        with self.lock:
+            self.redis_hits += hits
+            self.redis_misses += misses
+
+    def stats(self) -> Dict:
+        local_stats = self.get_cache().stats()
+        with self.lock:
+            lookups = self.redis_hits + self.redis_misses
+            redis_stats = {
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "hit_ratio": self.redis_hits / lookups if lookups else 0.0,
+            }
+
+        return {"local": local_stats, "redis": redis_stats}
+
+
+local = LocalTier()
+
+
+def publish(babble_ids: Optional[List[int]]) -> None:
+    """Drop babbles from every process's local tier; None drops all."""
+    if babble_ids is None:
+        local.get_cache().clear()
+    else:
+        local.get_cache().delete_many(babble_ids)
+    get_connection().publish(CHANNEL, json.dumps(babble_ids))
+
+
+def stats() -> Dict:
+    return local.stats()
+
+
+def get(babble_id: int) -> Optional[Dict]:
+    return get_many([babble_id]).get(babble_id)
+
+
+def get_many(babble_ids: Iterable[int]) -> Dict[int, Dict]:
+    return read_many(babble_ids)[0]
+
+
+def read_many(babble_ids: Iterable[int]) -> Tuple[Dict[int, Dict], List[int]]:
+    """The cached babbles, and the ids of those picked for early refresh."""
+    cache = local.get_cache()
+    babbles = {}
+    missing = []
+    expiring = []
+    for babble_id in babble_ids:
+        data = cache.get(babble_id)
+        if data is None:
+            missing.append(babble_id)
+        else:
+            babbles[babble_id] = data
+
+    if missing:
+        connection = get_connection()
+        keys = [babble_key(babble_id) for babble_id in missing]
+        pipeline = connection.pipeline(transaction=False)
+        for key in keys:
+            pipeline.hgetall(key)
+            pipeline.pttl(key)
+        connection.register_script(TOUCH_SCRIPT)(
+            keys=keys,
+            args=[settings.BABBLE_TIMEOUT, settings.BABBLE_MAX_TIMEOUT],
+            client=pipeline,
+        )
+        keyspace_stats.write(pipeline)
+        replies = pipeline.execute()[: len(keys) * 2]
+
+        found = 0
+        for babble_id, fields, ttl in zip(missing, replies[::2], replies[1::2]):
+            data = decode(fields)
+            if data is None:
+                continue
+
+            babbles[babble_id] = data
+            found += 1
+            delta = float(fields.get(b"delta", 0))
+            if singleflight.refresh_early(
+                ttl / 1000, delta, settings.CACHE_REBUILD["BETA"]
+            ):
+                expiring.append(babble_id)
+            else:
+                cache.set(babble_id, data)
+
+        local.count(found, len(missing) - found)
+        keyspace_stats.count("babble", found, len(missing) - found)
+
+    # Callers add viewer flags and pending counts to what they get.
+    return {babble_id: dict(data) for babble_id, data in babbles.items()}, expiring
+
+
+def rebuild_many(
+    babble_ids: List[int], build: Callable[[List[int]], Dict[int, Dict]]
+) -> Dict[int, Dict]:
+    start = time.perf_counter()
+    generations = get_generations(babble_ids)
+    babbles = build(babble_ids)
+    set_many(babbles, delta=time.perf_counter() - start, generations=generations)
+    return babbles
+
+
+def get_or_build_many(
+    babble_ids: Iterable[int], build: Callable[[List[int]], Dict[int, Dict]]
+) -> Dict[int, Dict]:
+    """Cached babbles, with the missing ones built by ``build(ids)``.
+
+    One caller at a time rebuilds a babble. The others wait a moment for it
+    to appear in the cache, or, when it is only being refreshed early, keep
+    serving the cached copy.
+    """
+    babble_ids = list(babble_ids)
+    babbles, expiring = read_many(babble_ids)
+    missing = [babble_id for babble_id in babble_ids if babble_id not in babbles]
+    if not missing and not expiring:
+        return babbles
+
+    connection = get_connection()
+    options = settings.CACHE_REBUILD
+    tokens = {}
+    for babble_id in missing + expiring:
+        token = singleflight.acquire(
+            connection, babble_key(babble_id), options["LOCK_TIMEOUT"]
+        )
+        if token is not None:
+            tokens[babble_id] = token
+
+    try:
+        if tokens:
+            babbles.update(rebuild_many(list(tokens), build))
+
+        waiting = [babble_id for babble_id in missing if babble_id not in tokens]
+        if waiting:
+
+            def read() -> Optional[Dict[int, Dict]]:
+                found = get_many(waiting)
+                return found if len(found) == len(waiting) else None
+
+            built = singleflight.wait_for(read, options["WAIT"])
+            babbles.update(built or rebuild_many(waiting, build))
+    finally:
+        for babble_id, token in tokens.items():
+            singleflight.release(connection, babble_key(babble_id), token)
+
+    return babbles
+
+
+def set(babble_id: int, data: Dict) -> None:
+    set_many({babble_id: data})
+
+
+def set_many(
+    babbles: Dict[int, Dict],
+    delta: float = 0.0,
+    generations: Optional[Dict[int, str]] = None,
+) -> None:
+    """Cache babbles that took ``delta`` seconds to build. With
+    ``generations``, from get_generations() before the build, babbles whose
+    counts were flushed since are left out."""
+    connection = get_connection()
+    script = connection.register_script(SET_SCRIPT)
+    pipeline = connection.pipeline()
+    for babble_id, data in babbles.items():
+        key = babble_key(babble_id)
+        if generations is None:
+            pipeline.delete(key)
+            pipeline.hset(key, mapping={**encode(data), "delta": delta})
+            pipeline.expire(key, settings.BABBLE_TIMEOUT)
+            continue
+
+        fields = [
+            item for field in {**encode(data), "delta": delta}.items() for item in field
+        ]
+        script(
+            keys=[key, generation_key(babble_id)],
+            args=[generations[babble_id], settings.BABBLE_TIMEOUT, *fields],
+            client=pipeline,
+        )
+    pipeline.execute()
+    publish(list(babbles))
+
+
+def get_generations(babble_ids: List[int]) -> Dict[int, str]:
+    if not babble_ids:
+        return {}
+    keys = [generation_key(babble_id) for babble_id in babble_ids]
+    values = get_connection().mget(keys)
+    return {
+        babble_id: (value or b"0").decode()
+        for babble_id, value in zip(babble_ids, values)
+    }
+
+
+def delete_flushed(babble_ids: List[int]) -> None:
+    """Drop babbles whose counts were just flushed, and turn away copies of
+    them that rebuilds in flight read before the flush. A generation is
+    kept for BABBLE_TIMEOUT, far longer than any rebuild takes."""
+    if not babble_ids:
+        return
+
+    pipeline = get_connection().pipeline()
+    for babble_id in babble_ids:
+        pipeline.incr(generation_key(babble_id))
+        pipeline.expire(generation_key(babble_id), settings.BABBLE_TIMEOUT)
+    pipeline.delete(*[babble_key(babble_id) for babble_id in babble_ids])
+    pipeline.execute()
+    publish(babble_ids)
+
+
+def delete(babble_id: int) -> None:
+    delete_many([babble_id])
+
+
+def delete_many(babble_ids: List[int]) -> None:
+    if babble_ids:
+        get_connection().delete(*[babble_key(babble_id) for babble_id in babble_ids])
+        publish(babble_ids)
+
+
+def clear() -> None:
+    get_connection().flushdb()
+    publish(None)
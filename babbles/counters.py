@@ -0,0 +1,196 @@
+# Write-behind engagement counters. Likes, rebabbles and comments add to
+# "counter:<babble_id>", a hash of pending deltas per count field, and mark
+# the babble in "counters:dirty". flush() moves the deltas into the Babble
+# rows; until then reads add the pending delta to the stored count. These
+# keys hold data not yet in the database, so they are not versioned and
+# have no TTL.
+#
+# A flush first claims a batch: each babble's counter hash is renamed to
+# "counter:<babble_id>:claimed" and the batch is recorded under a token in
+# "counters:flushes". The token is written to the database together with
+# the counts, so a claim left behind by a crashed flusher is applied at
+# most once by whichever flush recovers it.
+import json
+import time
+import uuid
+from datetime import timedelta
+from itertools import islice
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django_redis import get_redis_connection
+
+from babbles import babble_cache
+from babbles.models import Babble, CounterFlush
+
+DIRTY_KEY = "counters:dirty"
+FLUSHES_KEY = "counters:flushes"
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def counter_key(babble_id: int) -> str:
+    return f"counter:{babble_id}"
+
+
+def claimed_key(babble_id: int) -> str:
+    return f"counter:{babble_id}:claimed"
+
+
+# Claims the pending deltas of the babbles in ARGV[3..] (KEYS[3..] are their
+# counter and claimed hashes, in pairs) for flush ARGV[1]. A babble whose
+# previous claim is still in flight stays dirty for a later flush. Returns
+# the claimed ids.
+CLAIM_SCRIPT = """
+local claimed = {}
+for i = 3, #ARGV do
+    local pending, held = KEYS[2 * i - 3], KEYS[2 * i - 2]
+    if redis.call("EXISTS", held) == 0 then
+        if redis.call("EXISTS", pending) == 1 then
+            redis.call("RENAME", pending, held)
+            table.insert(claimed, ARGV[i])
+        end
+        redis.call("SREM", KEYS[1], ARGV[i])
+    end
+end
+if #claimed > 0 then
+    redis.call("HSET", KEYS[2], ARGV[1], cjson.encode({ids = claimed, at = ARGV[2]}))
+end
+return claimed
+"""
+
+
+def incr(babble_id: int, field: str, amount: int = 1) -> None:
+    pipeline = get_connection().pipeline()
+    pipeline.hincrby(counter_key(babble_id), field, amount)
+    pipeline.sadd(DIRTY_KEY, babble_id)
+    pipeline.execute()
+
+
+def incr_on_commit(babble_id: int, field: str, amount: int = 1) -> None:
+    # A rolled back like must not be counted.
+    transaction.on_commit(lambda: incr(babble_id, field, amount))
+
+
+def read_hashes(keys: List[str]) -> List[Dict[str, int]]:
+    pipeline = get_connection().pipeline(transaction=False)
+    for key in keys:
+        pipeline.hgetall(key)
+    return [
+        {field.decode(): int(delta) for field, delta in deltas.items()}
+        for deltas in pipeline.execute()
+    ]
+
+
+def pending(babble_ids: Iterable[int]) -> Dict[int, Dict[str, int]]:
+    """Deltas not yet in the database: new ones and those of flushes in
+    flight."""
+    babble_ids = list(babble_ids)
+    keys = [key for id in babble_ids for key in (counter_key(id), claimed_key(id))]
+    hashes = read_hashes(keys)
+
+    deltas = {}
+    for babble_id, new, held in zip(babble_ids, hashes[::2], hashes[1::2]):
+        values = {
+            field: new.get(field, 0) + held.get(field, 0) for field in {*new, *held}
+        }
+        if values:
+            deltas[babble_id] = values
+    return deltas
+
+
+def apply(serialized_babbles: List[Dict]) -> List[Dict]:
+    """Add the pending deltas to serialized babbles' stored counts."""
+    deltas = pending(data["id"] for data in serialized_babbles)
+    for data in serialized_babbles:
+        for field, delta in deltas.get(data["id"], {}).items():
+            data[field] = (data.get(field) or 0) + delta
+
+    return serialized_babbles
+
+
+def claim(token: str, babble_ids: List[int]) -> List[int]:
+    connection = get_connection()
+    keys = [DIRTY_KEY, FLUSHES_KEY]
+    for babble_id in babble_ids:
+        keys += [counter_key(babble_id), claimed_key(babble_id)]
+
+    claimed = connection.register_script(CLAIM_SCRIPT)(
+        keys=keys, args=[token, time.time(), *babble_ids]
+    )
+    return [int(babble_id) for babble_id in claimed]
+
+
+def write(token: str, babble_ids: List[int]) -> int:
+    """Add a claimed batch to the Babble rows, unless flush ``token`` is
+    already in the database, then drop the claim. Returns how many babbles
+    were updated."""
+    deltas = {
+        babble_id: values
+        for babble_id, values in zip(
+            babble_ids, read_hashes([claimed_key(id) for id in babble_ids])
+        )
+        if any(values.values())
+    }
+
+    try:
+        with transaction.atomic():
+            CounterFlush.objects.create(token=token)
+            for babble_id, values in deltas.items():
+                Babble.objects.filter(id=babble_id).update(
+                    **{field: F(field) + delta for field, delta in values.items()}
+                )
+    except IntegrityError:
+        # Another flush recovered and wrote this batch first.
+        deltas = {}
+
+    pipeline = get_connection().pipeline()
+    pipeline.delete(*[claimed_key(babble_id) for babble_id in babble_ids])
+    pipeline.hdel(FLUSHES_KEY, token)
+    pipeline.execute()
+
+    # Cached babbles hold stored counts. They are dropped, not incremented:
+    # one rebuilt since the commit already has the new counts, and one
+    # still being rebuilt from before it is turned away.
+    babble_cache.delete_flushed(babble_ids)
+
+    return len(deltas)
+
+
+def recover() -> int:
+    """Write the batches of flushes that stopped before finishing, for
+    example because the flusher crashed, once they are older than
+    COUNTER_CLAIM_TIMEOUT."""
+    # Tokens are only looked up while their claim may still be recovered.
+    CounterFlush.objects.filter(created__lt=timezone.now() - timedelta(days=1)).delete()
+
+    stale = time.time() - settings.COUNTER_CLAIM_TIMEOUT
+    flushed = 0
+    for token, batch in get_connection().hgetall(FLUSHES_KEY).items():
+        batch = json.loads(batch)
+        if float(batch["at"]) < stale:
+            flushed += write(token.decode(), [int(id) for id in batch["ids"]])
+    return flushed
+
+
+def flush(batch_size: Optional[int] = None) -> int:
+    """Write pending deltas to the Babble rows, one UPDATE per babble and
+    one transaction per batch. Returns how many babbles were updated."""
+    batch_size = batch_size or settings.COUNTER_FLUSH_BATCH
+    dirty = (int(id) for id in get_connection().smembers(DIRTY_KEY))
+    flushed = recover()
+
+    while batch := list(islice(dirty, batch_size)):
+        # Increments that arrive after the claim stay pending for the next
+        # flush; concurrent flushers never claim the same deltas.
+        token = uuid.uuid4().hex
+        claimed = claim(token, batch)
+        if claimed:
+            flushed += write(token, claimed)
+
+    return flushed
@@ -0,0 +1,203 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from babbles import babble_cache
+from babbles.models import Babble
+from babbles.serializers import BabbleSerializer
+from babbles.utils import (
+    TRANSCRIPTION_FIELDS,
+    apply_transcription,
+    save_tags,
+)
+from core.audio import probe_duration
+from core.exceptions import QueueFull, ServiceUnavailable
+from core.queues import get_queue
+from core.scheduler import Scheduler, SchedulerFull, SchedulerTimeout
+from core.stt import get_stt, keywords_from
+from notifications.utils import send_message_to_user
+from uploads.jobs import transcribe_segments
+from uploads.models import Upload
+
+logger = logging.getLogger(__name__)
+
+
+def check_queue_capacity() -> None:
+    queue = get_queue()
+
+    try:
+        depth = queue.size()
+    except queue.errors:
+        raise ServiceUnavailable(wait=settings.STT_RETRY_AFTER)
+
+    if depth >= settings.STT_QUEUE_MAX:
+        raise QueueFull(wait=settings.STT_RETRY_AFTER)
+
+
+def job_priority(duration: Optional[float], is_update: bool) -> int:
+    """0 for short new babbles, 1 for short edits and long new babbles, 2 for
+    long edits. Clips without a readable duration count as long."""
+    is_short = duration is not None and duration <= settings.STT_SHORT_SECONDS
+    return int(not is_short) + int(is_update)
+
+
+def job_score(priority: int, now: float) -> float:
+    # Aging: a job of class k ranks as if it was enqueued k * STT_PRIORITY_AGING
+    # seconds later, so it waits at most that long behind newer, cheaper jobs.
+    return now + priority * settings.STT_PRIORITY_AGING
+
+
+def enqueue_transcription(
+    babble: Babble, is_update: bool = False, upload: Optional[Any] = None
+) -> None:
+    babble.duration = probe_duration(babble.audio.path)
+    babble.save(update_fields=["duration"])
+
+    priority = job_priority(babble.duration, is_update)
+    job = {"babble_id": babble.id, "priority": priority}
+    if upload is not None:
+        # Reuses what was transcribed while the upload was in progress.
+        job["upload_id"] = upload.id
+
+    # The worker must not pick the job up before the babble row is visible.
+    transaction.on_commit(
+        lambda: get_queue().push(job, score=job_score(priority, time.time()))
+    )
+
+
+@transaction.atomic
+def complete_transcription(babble: Babble, result: Dict) -> Babble:
+    babble = apply_transcription(babble, result)
+    babble.status = Babble.DONE
+    babble.save(update_fields=["status", *TRANSCRIPTION_FIELDS])
+    babble = save_tags(babble, keywords_from(result))
+
+    serialized_data = BabbleSerializer(babble).data
+    babble_cache.set(babble.id, serialized_data)
+
+    send_message_to_user(
+        babble.user.id,
+        babble.user.id,
+        f"tags are ready for your babble {babble.id}",
+    )
+
+    logger.info(
+        {
+            "user": babble.user.username,
+            "babble_id": babble.id,
+            "tag": serialized_data["tags"],
+        }
+    )
+
+    return babble
+
+
+def run_transcription(job: Dict) -> None:
+    babble = Babble.objects.filter(id=job["babble_id"]).first()
+
+    # The babble was deleted while the job was waiting in the queue.
+    if babble is None or not babble.audio:
+        return
+
+    upload = Upload.objects.filter(id=job.get("upload_id")).first()
+    transcript = upload.transcript if upload else ""
+    offset = upload.transcribed_seconds if upload else 0.0
+
+    try:
+        result = get_stt().analyze(babble.audio.path, transcript, offset)
+    except (SchedulerFull, SchedulerTimeout):
+        # Put the job back instead of failing it; another slot frees up soon.
+        get_queue().push(job, score=job_score(job.get("priority", 0), time.time()))
+        return
+    except Exception:
+        logger.exception({"babble_id": babble.id, "message": "transcription failed"})
+        Babble.objects.filter(id=babble.id).update(status=Babble.FAILED)
+        return
+
+    complete_transcription(babble, result)
+
+
+def consume(timeout: float) -> None:
+    queue = get_queue()
+
+    while True:
+        job = queue.pop(timeout=timeout)
+        if job is None:
+            continue
+
+        close_old_connections()
+        try:
+            if "babble_id" in job:
+                run_transcription(job)
+            else:
+                transcribe_segments(job)
+        finally:
+            queue.ack(job)
+
+        logger.info(
+            {
+                **job,
+                "queue_depth": queue.size(),
+                **get_stt().scheduler.stats(),
+            }
+        )
+
+
+def reap_jobs() -> None:
+    """Requeue the jobs of workers that died mid-job, e.g. killed for running
+    out of memory. A job that keeps killing its worker fails its babble after
+    STT_MAX_ATTEMPTS tries instead of cycling forever."""
+    queue = get_queue()
+
+    for job in queue.reap():
+        attempts = job.get("attempts", 0) + 1
+        logger.info({**job, "message": "job lease expired", "attempts": attempts})
+
+        if attempts < settings.STT_MAX_ATTEMPTS:
+            job["attempts"] = attempts
+            queue.push(job, score=job_score(job.get("priority", 0), time.time()))
+        elif "babble_id" in job:
+            Babble.objects.filter(id=job["babble_id"]).update(status=Babble.FAILED)
+
+
+def reap(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        close_old_connections()
+        try:
+            reap_jobs()
+        except Exception:
+            logger.exception({"message": "reaping jobs failed"})
+
+
+def work(semaphore: Optional[Any] = None, timeout: float = 5.0) -> None:
+    if semaphore is not None:
+        get_stt().scheduler = Scheduler(
+            limit=settings.STT_CONCURRENCY,
+            max_waiting=settings.STT_MAX_WAITING,
+            timeout=settings.STT_WAIT_TIMEOUT,
+            semaphore=semaphore,
+        )
+
+    # Loaded before the chunk pool forks so its children share the models,
+    # and both before any thread starts (see STT.start_pool).
+    get_stt().preload()
+    get_stt().start_pool()
+
+    # Several jobs in flight per process let their sentiment requests share
+    # one batched forward pass.
+    threads = [
+        threading.Thread(target=consume, args=(timeout,), daemon=True)
+        for _ in range(settings.STT_WORKER_THREADS)
+    ]
+    threads.append(
+        threading.Thread(target=reap, args=(settings.STT_JOB_LEASE / 4,), daemon=True)
+    )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
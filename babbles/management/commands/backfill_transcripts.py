@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+
+from babbles.models import Babble
+from babbles.utils import TRANSCRIPTION_FIELDS, apply_transcription
+from core.stt import get_stt
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the transcript, sentiment, audio hash, duration and model "
+        "version on babbles that do not have them yet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Also refresh babbles transcribed by another model version.",
+        )
+
+    def handle(self, *args, **options):
+        stt = get_stt()
+        stt.start_pool()
+        query = Babble.objects.exclude(audio="").exclude(audio=None)
+        if options["all"]:
+            query = query.exclude(stt_version=stt.model_version)
+        else:
+            query = query.filter(audio_hash="")
+
+        last_id = 0
+        updated = failed = 0
+
+        while True:
+            # Keyset pagination so each batch is a cheap index range scan.
+            batch = list(
+                query.filter(id__gt=last_id).order_by("id")[: options["batch_size"]]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            babbles = []
+            for babble in batch:
+                try:
+                    result = stt.analyze(babble.audio.path)
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"babble {babble.id}: {e}")
+                    continue
+                babbles.append(apply_transcription(babble, result))
+
+            Babble.objects.bulk_update(babbles, TRANSCRIPTION_FIELDS)
+            updated += len(babbles)
+            self.stdout.write(f"{updated} babbles updated, last id {last_id}")
+
+        self.stdout.write(f"Done: {updated} updated, {failed} failed")
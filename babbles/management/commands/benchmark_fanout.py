@@ -0,0 +1,92 @@
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from babbles import timelines
+
+# Synthetic user ids, far above any real one.
+FIRST_USER_ID = 10**12
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure fan-out of one babble to N cached follower timelines, in "
+        "followers per second, for several script chunk sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--followers", type=int, nargs="+", default=[1000, 10000, 50000]
+        )
+        parser.add_argument(
+            "--chunk-sizes",
+            type=int,
+            nargs="+",
+            default=[1, 100, settings.TIMELINE_FANOUT_CHUNK, 2000],
+        )
+        parser.add_argument("--json", action="store_true")
+
+    def batches(self, user_ids, size: int = 1000):
+        user_ids = iter(user_ids)
+        while batch := list(islice(user_ids, size)):
+            yield batch
+
+    def prepare(self, user_ids) -> None:
+        connection = timelines.get_connection()
+        created = timezone.now()
+
+        for batch in self.batches(user_ids):
+            pipeline = connection.pipeline(transaction=False)
+            for user_id in batch:
+                key = timelines.timeline_key(user_id)
+                pipeline.delete(key)
+                pipeline.zadd(key, {0: created.timestamp()})
+                pipeline.expire(key, 600)
+            pipeline.execute()
+
+    def cleanup(self, user_ids) -> None:
+        connection = timelines.get_connection()
+        for batch in self.batches(user_ids):
+            connection.delete(*[timelines.timeline_key(user_id) for user_id in batch])
+
+    def handle(self, *args, **options):
+        results = []
+
+        for followers in options["followers"]:
+            user_ids = range(FIRST_USER_ID, FIRST_USER_ID + followers)
+            self.prepare(user_ids)
+
+            try:
+                for babble_id, chunk_size in enumerate(options["chunk_sizes"], 1):
+                    start = time.perf_counter()
+                    pushed = timelines.push(
+                        babble_id, timezone.now(), user_ids, chunk_size=chunk_size
+                    )
+                    elapsed = time.perf_counter() - start
+
+                    results.append(
+                        {
+                            "followers": followers,
+                            "chunk_size": chunk_size,
+                            "pushed": pushed,
+                            "seconds": elapsed,
+                            "followers_per_second": followers / elapsed,
+                        }
+                    )
+            finally:
+                self.cleanup(user_ids)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['followers']:>7} followers  chunk {result['chunk_size']:>5}  "
+                f"{result['seconds'] * 1000:9.1f} ms  "
+                f"{result['followers_per_second']:12.0f} followers/s"
+            )
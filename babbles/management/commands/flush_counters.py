@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from babbles import counters
+
+
+class Command(BaseCommand):
+    help = "Write pending like, rebabble and comment counts to the babbles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.COUNTER_FLUSH_INTERVAL,
+            help="Seconds between flushes.",
+        )
+        parser.add_argument("--once", action="store_true", help="Flush once and exit.")
+        parser.add_argument(
+            "--batch-size", type=int, default=settings.COUNTER_FLUSH_BATCH
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            flushed = counters.flush(options["batch_size"])
+            self.stdout.write(f"Flushed counts of {flushed} babbles")
+
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,63 @@
+import argparse
+import gc
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from babbles.jobs import work
+from core.stt import get_stt
+
+
+class Command(BaseCommand):
+    help = "Run the pool of processes that transcribe queued babbles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.STT_WORKERS)
+        parser.add_argument(
+            "--preload",
+            action=argparse.BooleanOptionalAction,
+            default=settings.STT_PRELOAD,
+            help="Load the models once before forking so workers share them.",
+        )
+
+    def handle(self, *args, **options):
+        if settings.CHANNEL_LAYERS["default"]["BACKEND"].endswith(
+            "InMemoryChannelLayer"
+        ):
+            self.stderr.write(
+                "CHANNEL_LAYERS is in-memory: notifications sent by the "
+                "workers will not reach connected clients."
+            )
+
+        # Forked children must open their own database connections.
+        connections.close_all()
+
+        context = multiprocessing.get_context("fork")
+
+        if options["preload"]:
+            get_stt().preload()
+            # Keep the collector from touching (and so copying) the weights'
+            # pages in the children.
+            gc.freeze()
+
+        # Created before forking so the concurrency limit holds across workers.
+        semaphore = context.BoundedSemaphore(settings.STT_CONCURRENCY)
+
+        processes = [
+            # Not daemonic: each worker forks its own pool for chunked audio.
+            context.Process(target=work, args=(semaphore,))
+            for _ in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+
+        self.stdout.write(f"Started {len(processes)} transcription workers")
+
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from babbles import timelines
+from babbles.utils import build_outbox, build_timeline, get_pull_authors
+from core import singleflight
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the cached timelines, and followed outboxes, of recently "
+        "active users. Run it with the new settings before shifting traffic "
+        "to a deploy that bumped CACHE_VERSIONS, then again with --cutover "
+        "once the old deploy has stopped serving."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hours",
+            type=float,
+            default=24,
+            help="Warm users who read their feed within this many hours.",
+        )
+        parser.add_argument("--limit", type=int, default=10000)
+        parser.add_argument(
+            "--cutover",
+            action="store_true",
+            help=(
+                "Rebuild these users' timelines and outboxes even if cached. "
+                "Until the old deploy stops serving it pushes babbles and "
+                "sets flags only under the old versions, so the copies "
+                "built before then are missing those writes."
+            ),
+        )
+
+    def build_once(self, key: str, build) -> bool:
+        # Live requests rebuilding the same key at the same time win.
+        connection = timelines.get_connection()
+        token = singleflight.acquire(
+            connection, key, settings.CACHE_REBUILD["LOCK_TIMEOUT"]
+        )
+        if token is None:
+            return False
+
+        try:
+            build()
+        finally:
+            singleflight.release(connection, key, token)
+        return True
+
+    def handle(self, *args, **options):
+        since = time.time() - options["hours"] * 60 * 60
+        user_ids = timelines.active_users(since, options["limit"])
+        cutover = options["cutover"]
+        warmed_outboxes = set()
+        warmed = 0
+
+        # Warmed keys keep TIMELINE_COLD_TIMEOUT until a reader on the new
+        # deploy extends them, so checking for them here must not read them.
+        start = time.perf_counter()
+        for user in User.objects.filter(id__in=user_ids).iterator():
+            if cutover or not timelines.exists(user.id):
+                warmed += self.build_once(
+                    timelines.timeline_key(user.id), lambda: build_timeline(user)
+                )
+
+            author_ids = list(set(get_pull_authors(user)) - warmed_outboxes)
+            if not cutover:
+                author_ids = timelines.missing_outboxes(author_ids)
+            for author_id in author_ids:
+                self.build_once(
+                    timelines.outbox_key(author_id), lambda: build_outbox(author_id)
+                )
+            warmed_outboxes |= set(author_ids)
+
+        self.stdout.write(
+            f"Warmed {warmed} of {len(user_ids)} active users' timelines and "
+            f"{len(warmed_outboxes)} outboxes in "
+            f"{time.perf_counter() - start:.1f} s"
+        )
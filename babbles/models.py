@@ -7,6 +7,15 @@ from users.models import User
 
 
 class Babble(models.Model):
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PROCESSING, "Processing"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+
     id = models.BigAutoField(primary_key=True, unique=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     audio = models.FileField(upload_to=audio_file_path, blank=True, null=True)
@@ -16,7 +25,25 @@ class Babble(models.Model):
     like_count = models.IntegerField(default=0, blank=True, null=True)
     comment_count = models.IntegerField(default=0, blank=True, null=True)
     rebabble_count = models.IntegerField(default=0, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=DONE)
+    transcript = models.TextField(blank=True)
+    sentiment = models.CharField(max_length=20, blank=True)
+    audio_hash = models.CharField(max_length=64, blank=True)
+    duration = models.FloatField(blank=True, null=True)
+    stt_version = models.CharField(max_length=255, blank=True)
     objects = DefaultManager()
 
     def __str__(self):
         return self.user.first_name
+
+    class Meta:
+        # Keyset pagination of feeds walks (created, id) backwards.
+        indexes = [models.Index(fields=["-created", "-id"])]
+
+
+class CounterFlush(models.Model):
+    """A batch of write-behind counts already added to the babbles. Written in
+    the same transaction as the counts, so a batch is never added twice."""
+
+    token = models.CharField(max_length=32, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
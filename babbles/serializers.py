@@ -3,7 +3,9 @@ from rest_framework.serializers import (
     SerializerMethodField,
     StringRelatedField,
 )
+from rest_framework.utils import model_meta
 
+from babbles.babble_cache import COUNTS
 from babbles.models import Babble
 from users.serializers import UserInSerializer
 
@@ -15,9 +17,38 @@ class BabbleSerializer(ModelSerializer):
     is_rebabbled = SerializerMethodField()
 
     class Meta:
-        fields = "__all__"
+        # The audio hash and model version are bookkeeping for the
+        # transcription cache and backfills, not part of the API.
+        exclude = ("audio_hash", "stt_version")
         model = Babble
         depth = 1
+        read_only_fields = (
+            "status",
+            "transcript",
+            "sentiment",
+            "duration",
+            *COUNTS,
+        )
+
+    def update(self, instance: Babble, validated_data: dict) -> Babble:
+        # The counts are only ever added to in place by counter flushes.
+        # Saving the whole row would write back the counts read with it and
+        # undo any flush that committed since.
+        relations = model_meta.get_field_info(instance).relations
+        many_to_many = {
+            field: validated_data.pop(field)
+            for field in list(validated_data)
+            if field in relations and relations[field].to_many
+        }
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save(update_fields=[*validated_data, "modified"])
+        instance.refresh_from_db(fields=COUNTS)
+
+        for field, value in many_to_many.items():
+            getattr(instance, field).set(value)
+
+        return instance
 
     def get_is_liked(self, obj: Babble) -> bool:
         return False
@@ -1,16 +1,45 @@
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db.models import F
+from django.test import SimpleTestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from babbles import babble_cache, timelines
+from babbles.jobs import (
+    complete_transcription,
+    job_priority,
+    job_score,
+    reap_jobs,
+)
 from babbles.models import Babble
+from babbles.serializers import BabbleSerializer
+from babbles.utils import set_caches
+from core import singleflight
+from core.queues import get_queue
+from core.utils import file_hash
 from followers.models import Follower
 from users.models import User
 
 
 class BabbleViewSetTestCase(APITestCase):
     def setUp(self):
+        # Ids are reused between tests, so timelines and babbles cached by
+        # an earlier test would leak into this one.
+        caches["default"].clear()
+        babble_cache.clear()
+
         self.user1 = User.objects.create_user(
             username="user1", password="user1_password"
         )
@@ -51,10 +80,92 @@ class BabbleViewSetTestCase(APITestCase):
             Babble.objects.filter(user=self.user1).exclude(audio="").exists()
         )
 
+    def test_create_babble_enqueues_transcription(self):
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            STT_QUEUE={
+                "BACKEND": "core.queues.SQLiteQueue",
+                "LOCATION": os.path.join(tmp_dir, "queue.sqlite3"),
+            }
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                with open("test.mp3", "rb") as test_audio_file:
+                    response = self.client.post(
+                        self.babble_url, {"audio": test_audio_file}, format="multipart"
+                    )
+
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data["status"], Babble.PROCESSING)
+            self.assertEqual(
+                get_queue().pop(timeout=0)["babble_id"], response.data["id"]
+            )
+
+    @override_settings(STT_QUEUE_MAX=0)
+    def test_create_babble_queue_full(self):
+        with open("test.mp3", "rb") as test_audio_file:
+            response = self.client.post(
+                self.babble_url, {"audio": test_audio_file}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn("Retry-After", response)
+
+    def test_reap_jobs_requeues_then_fails(self):
+        self.babble1.status = Babble.PROCESSING
+        self.babble1.save()
+
+        with tempfile.TemporaryDirectory() as tmp_dir, override_settings(
+            STT_QUEUE={
+                "BACKEND": "core.queues.SQLiteQueue",
+                "LOCATION": os.path.join(tmp_dir, "queue.sqlite3"),
+            },
+            STT_JOB_LEASE=0,
+            STT_MAX_ATTEMPTS=2,
+        ):
+            queue = get_queue()
+            queue.push({"babble_id": self.babble1.id})
+
+            # The worker dies without acking, twice.
+            queue.pop(timeout=0)
+            reap_jobs()
+            self.assertEqual(queue.pop(timeout=0)["attempts"], 1)
+            reap_jobs()
+
+            self.assertIsNone(queue.pop(timeout=0))
+
+        self.babble1.refresh_from_db()
+        self.assertEqual(self.babble1.status, Babble.FAILED)
+
+    def test_complete_transcription(self):
+        self.babble1.status = Babble.PROCESSING
+        self.babble1.save()
+
+        complete_transcription(
+            self.babble1,
+            {
+                "text": "오디오 트위터",
+                "sentiment": "긍정",
+                "nouns": ["오디오", "트위터"],
+                "duration": 3.0,
+                "audio_hash": "hash",
+                "version": "fake",
+            },
+        )
+
+        self.babble1.refresh_from_db()
+        self.assertEqual(self.babble1.status, Babble.DONE)
+        self.assertEqual(self.babble1.transcript, "오디오 트위터")
+        self.assertEqual(self.babble1.audio_hash, "hash")
+        self.assertEqual(
+            set(self.babble1.tags.values_list("text", flat=True)),
+            {"긍정", "오디오", "트위터"},
+        )
+
     def test_retrieve_babble(self):
         response = self.client.get(reverse("babbles-detail", args=[self.babble1.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["audio"], self.babble1.audio.url)
+        self.assertNotIn("audio_hash", response.data)
+        self.assertNotIn("stt_version", response.data)
 
     def test_partial_update_babble(self):
         temp = self.babble1.audio
@@ -66,6 +177,31 @@ class BabbleViewSetTestCase(APITestCase):
         self.babble1.refresh_from_db()
         self.assertNotEqual(self.babble1.audio, temp)
 
+    def test_partial_update_same_audio_keeps_transcript(self):
+        self.babble1.audio_hash = file_hash(self.babble1.audio.path)
+        self.babble1.save()
+
+        with open("test.mp3", "rb") as test_audio_file:
+            response = self.client.patch(
+                reverse("babbles-detail", args=[self.babble1.id]),
+                {"audio": test_audio_file},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Babble.DONE)
+
+    def test_partial_update_keeps_flushed_counts(self):
+        babble = Babble.objects.get(id=self.babble1.id)
+        Babble.objects.filter(id=babble.id).update(like_count=F("like_count") + 3)
+
+        serializer = BabbleSerializer(babble, data={"like_count": 0}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        self.babble1.refresh_from_db()
+        self.assertEqual(self.babble1.like_count, 3)
+        self.assertEqual(serializer.data["like_count"], 3)
+
     def test_destroy_babble(self):
         response = self.client.delete(reverse("babbles-detail", args=[self.babble1.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -75,13 +211,141 @@ class BabbleViewSetTestCase(APITestCase):
         Follower.objects.create(user=self.user1, following=self.user2)
         response = self.client.get(self.babble_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_list_babbles2(self):
         response = self.client.get(self.babble_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data["results"]), 1)
 
+    def test_new_babble_tops_follower_timeline(self):
+        Follower.objects.create(user=self.user2, following=self.user1)
+        user2_token = RefreshToken.for_user(self.user2)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user2_token.access_token}")
+        self.client.get(self.babble_url)
+
+        babble = Babble.objects.create(user=self.user1, audio=self.test_audio_file2)
+        with self.captureOnCommitCallbacks(execute=True):
+            set_caches(babble, self.user1, BabbleSerializer(babble).data)
+        self.client.post(reverse("likes", kwargs={"babble_id": babble.id}))
+
+        response = self.client.get(self.babble_url)
+        self.assertEqual(response.data["results"][0]["id"], babble.id)
+        self.assertTrue(response.data["results"][0]["is_liked"])
+
+    @override_settings(FEED_PULL_THRESHOLD=1)
+    def test_popular_author_is_pulled_into_feed(self):
+        Follower.objects.create(user=self.user2, following=self.user1)
+        User.objects.filter(id=self.user1.id).update(follower_count=1)
+        self.user1.refresh_from_db()
+        user2_token = RefreshToken.for_user(self.user2)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user2_token.access_token}")
+        self.client.get(self.babble_url)
+
+        babble = Babble.objects.create(user=self.user1, audio=self.test_audio_file2)
+        with self.captureOnCommitCallbacks(execute=True):
+            set_caches(babble, self.user1, BabbleSerializer(babble).data)
+
+        pushed_ids = [id for _, id in timelines.read(self.user2.id, 10).entries]
+        self.assertNotIn(babble.id, pushed_ids)
+        response = self.client.get(self.babble_url)
+        self.assertEqual(response.data["results"][0]["id"], babble.id)
+        self.assertEqual(len(response.data["results"]), 3)
+
+    @override_settings(FEED_PULL_THRESHOLD=2)
+    def test_author_dropping_below_pull_threshold_stays_in_feed(self):
+        user3 = User.objects.create_user(username="user3", password="user3_password")
+        Follower.objects.create(user=self.user2, following=self.user1)
+        Follower.objects.create(user=user3, following=self.user1)
+        User.objects.filter(id=self.user1.id).update(follower_count=2)
+        self.user1.refresh_from_db()
+        user2_token = RefreshToken.for_user(self.user2)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user2_token.access_token}")
+        self.client.get(self.babble_url)
+
+        # Posted while pulled: only the outbox gets it.
+        babble = Babble.objects.create(user=self.user1, audio=self.test_audio_file2)
+        with self.captureOnCommitCallbacks(execute=True):
+            set_caches(babble, self.user1, BabbleSerializer(babble).data)
+
+        user3_token = RefreshToken.for_user(user3)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user3_token.access_token}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("followers", kwargs={"user_id": self.user1.id}))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {user2_token.access_token}")
+        response = self.client.get(self.babble_url)
+        self.assertEqual(response.data["results"][0]["id"], babble.id)
+
+    @override_settings(TIMELINE_SIZE=3)
+    def test_list_babbles_cursor_pages(self):
+        for _ in range(6):
+            Babble.objects.create(user=self.user1, audio=self.test_audio_file2)
+        expected = list(
+            Babble.objects.filter(user=self.user1)
+            .order_by("-created", "-id")
+            .values_list("id", flat=True)
+        )
+
+        first = self.client.get(self.babble_url)
+        second = self.client.get(self.babble_url, {"next": first.data["next"]})
+
+        ids = [babble["id"] for babble in first.data["results"]]
+        ids += [babble["id"] for babble in second.data["results"]]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(second.data["next"])
+
+    @override_settings(TIMELINE_COLD_TIMEOUT=60, TIMELINE_TIMEOUT=600)
+    def test_reading_a_timeline_keeps_it(self):
+        timelines.store(self.user1.id, [(1, self.babble1.created)], {})
+        key = timelines.timeline_key(self.user1.id)
+        connection = timelines.get_connection()
+        self.assertLessEqual(connection.ttl(key), 60)
+
+        timelines.read(self.user1.id, 5)
+        self.assertGreater(connection.ttl(key), 60)
+
+    def test_warm_timelines_rebuilds_active_users(self):
+        self.client.get(self.babble_url)
+        self.assertEqual(timelines.active_users(0, 10), [self.user1.id])
+
+        with override_settings(
+            CACHE_VERSIONS={**settings.CACHE_VERSIONS, "timeline": 2}
+        ):
+            self.assertFalse(timelines.exists(self.user1.id))
+            call_command("warm_timelines", stdout=StringIO())
+            feed = timelines.read(self.user1.id, 10)
+
+        self.assertEqual([id for _, id in feed.entries], [self.babble1.id])
+
+    @override_settings(TIMELINE_COLD_TIMEOUT=60, TIMELINE_TIMEOUT=600)
+    def test_warm_timelines_cutover_catches_up(self):
+        self.client.get(self.babble_url)
+
+        with override_settings(
+            CACHE_VERSIONS={**settings.CACHE_VERSIONS, "timeline": 2}
+        ):
+            call_command("warm_timelines", stdout=StringIO())
+        key = f"timeline:v2:{self.user1.id}"
+        self.assertLessEqual(timelines.get_connection().ttl(key), 60)
+
+        # Posted on the old deploy, so only the v1 timeline gets it.
+        with self.captureOnCommitCallbacks(execute=True):
+            babble = Babble.objects.create(user=self.user1, audio=self.test_audio_file2)
+            set_caches(babble, self.user1, BabbleSerializer(babble).data)
+
+        with override_settings(
+            CACHE_VERSIONS={**settings.CACHE_VERSIONS, "timeline": 2}
+        ):
+            call_command("warm_timelines", "--cutover", stdout=StringIO())
+            feed = timelines.read(self.user1.id, 10)
+
+        self.assertEqual([id for _, id in feed.entries], [babble.id, self.babble1.id])
+
+    def test_list_babbles_invalid_cursor(self):
+        response = self.client.get(self.babble_url, {"next": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_explore_babbles(self):
         response = self.client.get(reverse("babbles-explore"))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -129,3 +393,130 @@ class BabbleViewSetTestCase(APITestCase):
         self.client.credentials()
         response = self.client.get(reverse("babbles-profile", args=[self.user2.id]))
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(STT_SHORT_SECONDS=30, STT_PRIORITY_AGING=60)
+class TranscriptionPriorityTestCase(SimpleTestCase):
+    def test_short_new_babbles_first(self):
+        self.assertEqual(job_priority(5, is_update=False), 0)
+        self.assertEqual(job_priority(5, is_update=True), 1)
+        self.assertEqual(job_priority(600, is_update=False), 1)
+        self.assertEqual(job_priority(600, is_update=True), 2)
+        self.assertEqual(job_priority(None, is_update=False), 1)
+
+    def test_aging_bounds_wait(self):
+        long_edit = job_score(2, now=0)
+        self.assertLess(job_score(0, now=100), long_edit)
+        self.assertGreater(job_score(0, now=121), long_edit)
+
+
+class BabbleCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        babble_cache.clear()
+
+    def test_round_trip(self):
+        data = {"id": 1, "tags": ["cat"], "like_count": 2, "comment_count": None}
+        babble_cache.set(1, data)
+
+        self.assertEqual(
+            babble_cache.get(1),
+            {
+                "id": 1,
+                "tags": ["cat"],
+                "like_count": 2,
+                "comment_count": 0,
+                "rebabble_count": 0,
+            },
+        )
+        self.assertIsNone(babble_cache.get(2))
+
+    def test_rebuild_raced_by_a_flush_is_not_cached(self):
+        def build(babble_ids):
+            # The counts are read, then a flush commits and drops the babble.
+            babble_cache.delete_flushed(babble_ids)
+            return {babble_id: {"id": babble_id} for babble_id in babble_ids}
+
+        self.assertEqual(babble_cache.rebuild_many([1], build), {1: {"id": 1}})
+        self.assertIsNone(babble_cache.get(1))
+
+        babble_cache.rebuild_many([1], lambda ids: {1: {"id": 1}})
+        self.assertEqual(babble_cache.get(1)["id"], 1)
+
+    def test_hot_babbles_are_read_from_memory(self):
+        babble_cache.set(1, {"id": 1})
+        before = babble_cache.stats()
+
+        babble_cache.get(1)
+        babble_cache.get(1)["id"] = 2
+
+        after = babble_cache.stats()
+        self.assertEqual(after["redis"]["hits"] - before["redis"]["hits"], 1)
+        self.assertEqual(after["local"]["hits"] - before["local"]["hits"], 1)
+        self.assertEqual(babble_cache.get(1)["id"], 1)
+
+    def test_other_processes_invalidate_local_copies(self):
+        babble_cache.set(1, {"id": 1, "transcript": "old"})
+        babble_cache.get(1)
+
+        # What another worker does on set, without touching this one's tier.
+        babble_cache.get_connection().hset(
+            babble_cache.babble_key(1),
+            "data",
+            json.dumps({"id": 1, "transcript": "new"}),
+        )
+        babble_cache.get_connection().publish(babble_cache.CHANNEL, "[1]")
+
+        for _ in range(50):
+            if babble_cache.get(1)["transcript"] == "new":
+                break
+            time.sleep(0.05)
+        self.assertEqual(babble_cache.get(1)["transcript"], "new")
+
+    def test_concurrent_misses_build_once(self):
+        builds = []
+
+        def build(babble_ids):
+            builds.append(babble_ids)
+            time.sleep(0.1)
+            return {babble_id: {"id": babble_id} for babble_id in babble_ids}
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: babble_cache.get_or_build_many([1], build), range(8)
+                )
+            )
+
+        self.assertEqual(builds, [[1]])
+        self.assertTrue(all(result[1]["id"] == 1 for result in results))
+
+    def test_expiring_babbles_are_refreshed_early(self):
+        # A babble that took "forever" to build is always due for refresh.
+        babble_cache.set_many({1: {"id": 1, "transcript": "old"}}, delta=1e9)
+
+        def build(babble_ids):
+            return {1: {"id": 1, "transcript": "new"}}
+
+        connection = babble_cache.get_connection()
+        token = singleflight.acquire(connection, babble_cache.babble_key(1), 5)
+        babbles = babble_cache.get_or_build_many([1], build)
+        self.assertEqual(babbles[1]["transcript"], "old")
+
+        singleflight.release(connection, babble_cache.babble_key(1), token)
+        babbles = babble_cache.get_or_build_many([1], build)
+        self.assertEqual(babbles[1]["transcript"], "new")
+
+    @override_settings(BABBLE_TIMEOUT=60, BABBLE_MAX_TIMEOUT=150)
+    def test_reads_extend_popular_babbles(self):
+        babble_cache.set(1, {"id": 1})
+        connection = babble_cache.get_connection()
+        self.assertLessEqual(connection.ttl(babble_cache.babble_key(1)), 60)
+
+        babble_cache.local.get_cache().clear()
+        babble_cache.get(1)
+        self.assertGreater(connection.ttl(babble_cache.babble_key(1)), 60)
+
+        for _ in range(3):
+            babble_cache.local.get_cache().clear()
+            babble_cache.get(1)
+        self.assertEqual(connection.ttl(babble_cache.babble_key(1)), 150)
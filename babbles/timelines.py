@@ -0,0 +1,299 @@
+# Home timelines: "timeline:v<n>:<user_id>" is a sorted set of babble ids
+# scored by creation time, "timeline:v<n>:<user_id>:flags" a hash of the
+# viewer's is_liked / is_rebabbled flags. "outbox:v<n>:<author_id>" holds an
+# author's own babbles; feeds pull those of popular authors instead of having
+# them pushed. Missing keys are rebuilt from the database on the next read.
+# "active:users" scores users by when they last read their feed.
+import heapq
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from core.cachestats import KeyspaceStats, keyspace_of
+from core.namespaces import namespace
+from core.pagination import Position
+
+FLAGS = ("is_liked", "is_rebabbled")
+ACTIVE_KEY = "active:users"
+
+keyspace_stats = KeyspaceStats()
+
+
+def get_connection():
+    return get_redis_connection("default")
+
+
+def timeline_key(user_id: int) -> str:
+    return f"{namespace('timeline')}:{user_id}"
+
+
+def flags_key(user_id: int) -> str:
+    return f"{namespace('timeline')}:{user_id}:flags"
+
+
+def outbox_key(author_id: int) -> str:
+    return f"{namespace('outbox')}:{author_id}"
+
+
+# Pushes one babble onto every timeline in KEYS that exists, trimming each
+# to ARGV[3] entries. Runs atomically, one round trip per chunk of keys.
+PUSH_SCRIPT = """
+local pushed = 0
+for _, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then
+        redis.call("ZADD", key, ARGV[1], ARGV[2])
+        redis.call("ZREMRANGEBYRANK", key, 0, -tonumber(ARGV[3]) - 1)
+        pushed = pushed + 1
+    end
+end
+return pushed
+"""
+
+
+def push_keys(
+    keys: Iterable[str], babble_id: int, created: datetime, chunk_size: int
+) -> int:
+    connection = get_connection()
+    script = connection.register_script(PUSH_SCRIPT)
+    args = [created.timestamp(), babble_id, settings.TIMELINE_SIZE]
+
+    keys = iter(keys)
+    pipeline = connection.pipeline(transaction=False)
+    while chunk := list(islice(keys, chunk_size)):
+        script(keys=chunk, args=args, client=pipeline)
+
+    return sum(pipeline.execute())
+
+
+def push(
+    babble_id: int,
+    created: datetime,
+    user_ids: Iterable[int],
+    chunk_size: Optional[int] = None,
+) -> int:
+    """Add a babble to every listed timeline that is cached and return how
+    many timelines it went to."""
+    keys = (timeline_key(user_id) for user_id in user_ids)
+    return push_keys(
+        keys, babble_id, created, chunk_size or settings.TIMELINE_FANOUT_CHUNK
+    )
+
+
+def push_outbox(babble_id: int, created: datetime, author_id: int) -> None:
+    push_keys([outbox_key(author_id)], babble_id, created, 1)
+
+
+def store(
+    user_id: int,
+    entries: List[Tuple[int, datetime]],
+    flags: Dict[int, Dict[str, bool]],
+) -> None:
+    """Replace a timeline with ``entries`` and the viewer flags for them."""
+    timeline, flag_hash = timeline_key(user_id), flags_key(user_id)
+    mapping = scores(entries)
+    fields = {
+        f"{name}:{babble_id}": 1
+        for babble_id, values in flags.items()
+        for name in FLAGS
+        if values.get(name)
+    }
+
+    pipeline = get_connection().pipeline()
+    pipeline.delete(timeline, flag_hash)
+    if mapping:
+        pipeline.zadd(timeline, mapping)
+        pipeline.expire(timeline, settings.TIMELINE_COLD_TIMEOUT)
+    if fields:
+        pipeline.hset(flag_hash, mapping=fields)
+        pipeline.expire(flag_hash, settings.TIMELINE_COLD_TIMEOUT)
+    pipeline.execute()
+
+
+def store_outbox(author_id: int, entries: List[Tuple[int, datetime]]) -> None:
+    outbox = outbox_key(author_id)
+
+    pipeline = get_connection().pipeline()
+    pipeline.delete(outbox)
+    if entries:
+        pipeline.zadd(outbox, scores(entries))
+        pipeline.expire(outbox, settings.TIMELINE_COLD_TIMEOUT)
+    pipeline.execute()
+
+
+def scores(entries: List[Tuple[int, datetime]]) -> Dict[int, float]:
+    return {babble_id: created.timestamp() for babble_id, created in entries}
+
+
+class Feed(NamedTuple):
+    # Newest first.
+    entries: List[Position]
+    # The oldest entry of a feed that was trimmed: the database may hold
+    # older babbles that this feed no longer has. None when complete.
+    horizon: Optional[Position]
+
+
+def read_keys(
+    keys: List[str],
+    count: int,
+    before: Optional[Position] = None,
+    extend: Iterable[str] = (),
+) -> List[Optional[Feed]]:
+    """The newest ``count`` entries of each key older than ``before``, or
+    None for keys that are not cached. Reading a key, and the ``extend``
+    keys that belong to it, keeps them for another TIMELINE_TIMEOUT."""
+    step = 5 if before is None else 6
+    pipeline = get_connection().pipeline(transaction=False)
+    for key in keys:
+        pipeline.exists(key)
+        pipeline.expire(key, settings.TIMELINE_TIMEOUT)
+        pipeline.zcard(key)
+        pipeline.zrange(key, 0, 0, withscores=True)
+        if before is None:
+            pipeline.zrevrange(key, 0, count - 1, withscores=True)
+        else:
+            # Babbles created in the same microsecond are ordered by id.
+            pipeline.zrangebyscore(key, before[0], before[0], withscores=True)
+            pipeline.zrevrangebyscore(
+                key, f"({before[0]!r}", "-inf", start=0, num=count, withscores=True
+            )
+    for key in extend:
+        pipeline.expire(key, settings.TIMELINE_TIMEOUT)
+    keyspace_stats.write(pipeline)
+    results = pipeline.execute()
+
+    feeds = []
+    for key, index in zip(keys, range(0, len(keys) * step, step)):
+        exists, _, size, oldest, *ranges = results[index : index + step]
+        keyspace_stats.count(keyspace_of(key), int(bool(exists)), int(not exists))
+        if not exists:
+            feeds.append(None)
+            continue
+
+        entries = [
+            (score, int(babble_id)) for found in ranges for babble_id, score in found
+        ]
+        if before is not None:
+            entries = [entry for entry in entries if entry < before]
+        entries.sort(reverse=True)
+
+        horizon = None
+        if size >= settings.TIMELINE_SIZE:
+            horizon = (oldest[0][1], int(oldest[0][0]))
+        feeds.append(Feed(entries[:count], horizon))
+
+    return feeds
+
+
+def read(user_id: int, count: int, before: Optional[Position] = None) -> Optional[Feed]:
+    return read_keys(
+        [timeline_key(user_id)], count, before, extend=[flags_key(user_id)]
+    )[0]
+
+
+def read_outboxes(
+    author_ids: List[int], count: int, before: Optional[Position] = None
+) -> Dict[int, Optional[Feed]]:
+    keys = [outbox_key(author_id) for author_id in author_ids]
+    return dict(zip(author_ids, read_keys(keys, count, before)))
+
+
+def merge(*feeds: List[Position]) -> List[Position]:
+    """K-way merge of newest-first feeds into one newest-first list.
+
+    A babble can be in a timeline and an outbox at once when its author
+    crossed the pull threshold, so repeats are dropped.
+    """
+    seen = set()
+    entries = []
+    for entry in heapq.merge(*feeds, reverse=True):
+        if entry[1] not in seen:
+            seen.add(entry[1])
+            entries.append(entry)
+    return entries
+
+
+def get_flags(user_id: int, babble_ids: List[int]) -> Dict[int, Dict[str, bool]]:
+    if not babble_ids:
+        return {}
+
+    fields = [f"{name}:{babble_id}" for babble_id in babble_ids for name in FLAGS]
+    values = iter(get_connection().hmget(flags_key(user_id), fields))
+
+    return {
+        babble_id: {name: next(values) is not None for name in FLAGS}
+        for babble_id in babble_ids
+    }
+
+
+def set_flag(user_id: int, babble_id: int, name: str, value: bool) -> None:
+    connection = get_connection()
+    field = f"{name}:{babble_id}"
+
+    if value:
+        pipeline = connection.pipeline()
+        pipeline.hset(flags_key(user_id), field, 1)
+        pipeline.expire(flags_key(user_id), settings.TIMELINE_TIMEOUT)
+        pipeline.execute()
+    else:
+        connection.hdel(flags_key(user_id), field)
+
+
+def remove(user_id: int, babble_ids: List[int]) -> None:
+    if babble_ids:
+        get_connection().zrem(timeline_key(user_id), *babble_ids)
+
+
+def remove_from_outbox(author_id: int, babble_id: int) -> None:
+    get_connection().zrem(outbox_key(author_id), babble_id)
+
+
+def delete(user_id: int) -> None:
+    get_connection().delete(timeline_key(user_id), flags_key(user_id))
+
+
+def delete_many(user_ids: Iterable[int]) -> None:
+    connection = get_connection()
+    user_ids = iter(user_ids)
+    while chunk := list(islice(user_ids, settings.TIMELINE_FANOUT_CHUNK)):
+        connection.delete(
+            *(
+                key
+                for user_id in chunk
+                for key in (timeline_key(user_id), flags_key(user_id))
+            )
+        )
+
+
+def mark_active(user_id: int) -> None:
+    get_connection().zadd(ACTIVE_KEY, {user_id: time.time()})
+
+
+def active_users(since: float, limit: int) -> List[int]:
+    """The most recently active users since the ``since`` timestamp, dropping
+    those who have not been seen for TIMELINE_TIMEOUT."""
+    connection = get_connection()
+    connection.zremrangebyscore(
+        ACTIVE_KEY, "-inf", time.time() - settings.TIMELINE_TIMEOUT
+    )
+    user_ids = connection.zrevrangebyscore(
+        ACTIVE_KEY, "+inf", since, start=0, num=limit
+    )
+    return [int(user_id) for user_id in user_ids]
+
+
+def exists(user_id: int) -> bool:
+    return bool(get_connection().exists(timeline_key(user_id)))
+
+
+def missing_outboxes(author_ids: List[int]) -> List[int]:
+    """The authors whose outbox is not cached. Unlike reading, checking does
+    not extend the outboxes that are."""
+    pipeline = get_connection().pipeline(transaction=False)
+    for author_id in author_ids:
+        pipeline.exists(outbox_key(author_id))
+    found = pipeline.execute()
+    return [author_id for author_id, cached in zip(author_ids, found) if not cached]
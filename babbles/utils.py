@@ -1,44 +1,42 @@
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-from django.core.cache import caches
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.http import HttpRequest
 
+from babbles import babble_cache, timelines
 from babbles.models import Babble
 from babbles.serializers import BabbleSerializer
-from core.stt import STT
-from likes.models import Like
-from rebabbles.models import Rebabble
+from core.pagination import Position, created_of, position_of
+from core.singleflight import single_flight
+from core.viewer import check_viewer_state, get_viewer_state
+from followers.models import Follower
 from tags.models import Tag
 from users.models import User
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-stt = STT()
+PAGE_SIZE = 5
 
 
-def check_rebabbled(serialized_babbles: List[Dict], user: User) -> List[Dict]:
-    rebabbled_babble_ids = set(
-        Rebabble.objects.filter(user=user).values_list("babble__id", flat=True)
-    )
-    for data in serialized_babbles:
-        data["is_rebabbled"] = data["id"] in rebabbled_babble_ids
-
-    return serialized_babbles
-
+TRANSCRIPTION_FIELDS = [
+    "transcript",
+    "sentiment",
+    "audio_hash",
+    "duration",
+    "stt_version",
+]
 
-def check_liked(serialized_babbles: List[Dict], user: User) -> List[Dict]:
-    liked_babbles_id = set(
-        Like.objects.filter(user=user).values_list("babble__id", flat=True)
-    )
-    for data in serialized_babbles:
-        data["is_liked"] = data["id"] in liked_babbles_id
 
-    return serialized_babbles
+def apply_transcription(babble: Babble, result: Dict) -> Babble:
+    babble.transcript = result["text"]
+    babble.sentiment = result["sentiment"]
+    babble.audio_hash = result["audio_hash"]
+    babble.duration = result["duration"]
+    babble.stt_version = result["version"]
+    return babble
 
 
-def save_keywords(babble: Babble) -> Babble:
-    keywords = stt.get_keywords(babble.audio.path)
+def save_tags(babble: Babble, keywords: List[str]) -> Babble:
     tag_objs = Tag.objects.filter(text__in=keywords)
     new_tags = set(keywords) - set(tag_objs.values_list("text", flat=True))
 
@@ -48,142 +46,201 @@ def save_keywords(babble: Babble) -> Babble:
         tag_objs = set(tag_objs) | set(new_tag_objs)
 
     babble.tags.set(tag_objs)
-    babble.save()
 
     return babble
 
 
 def set_follower_cache(babble: Babble, user: User) -> None:
-    follower_ids = user.following.values_list("user_id", flat=True)
-    babble_id = babble.id
-
-    for user_id in follower_ids:
-        user_cache_data = user_cache.get(user_id, {})
-        cache_data = {
-            "is_rebabble": False,
-            "is_like": False,
-        }
+    timelines.push_outbox(babble.id, babble.created, user.id)
 
-        if babble_id in user_cache_data:
-            cache_data.update(user_cache_data[babble_id])
-            user_cache_data.pop(babble_id)
+    # Popular authors are merged into their followers' feeds at read time, so
+    # posting costs the same however many followers they have.
+    if user.follower_count >= settings.FEED_PULL_THRESHOLD:
+        return
 
-        user_cache_data = {babble.id: cache_data, **user_cache_data}
-
-        if len(user_cache_data) > 30:
-            user_cache_data.popitem()
+    follower_ids = user.following.values_list("user_id", flat=True).iterator(
+        chunk_size=settings.TIMELINE_FANOUT_CHUNK
+    )
+    timelines.push(babble.id, babble.created, follower_ids)
 
-        user_cache.set(user_id, user_cache_data)
 
+def drop_pulled_authors(author_ids: Iterable[int]) -> None:
+    """Call after lowering these authors' follower counts, inside the same
+    transaction.
 
-def set_user_cache(babble: Babble, user: User) -> None:
-    user_cache_data = user_cache.get(user.id, {})
+    Babbles posted at or over FEED_PULL_THRESHOLD only went to the author's
+    outbox. An author that just dropped below it is no longer pulled, so the
+    timelines of their followers are dropped, to be rebuilt from the
+    database with those babbles, once the change commits.
+    """
+    dropped = User.objects.filter(
+        id__in=author_ids, follower_count=settings.FEED_PULL_THRESHOLD - 1
+    ).values_list("id", flat=True)
 
-    data = {
-        babble.id: {
-            "is_rebabble": False,
-            "is_like": False,
-        }
-    }
+    for author_id in dropped:
+        follower_ids = Follower.objects.filter(following_id=author_id).values_list(
+            "user_id", flat=True
+        )
+        transaction.on_commit(
+            lambda follower_ids=follower_ids: timelines.delete_many(
+                follower_ids.iterator(chunk_size=settings.TIMELINE_FANOUT_CHUNK)
+            )
+        )
 
-    user_cache_data = {**data, **user_cache_data}
 
-    user_cache.set(user.id, user_cache_data)
+def set_user_cache(babble: Babble, user: User) -> None:
+    timelines.push(babble.id, babble.created, [user.id])
 
 
 def set_caches(babble: Babble, user: User, serialized_data) -> None:
     set_user_cache(babble, user)
-    set_follower_cache(babble, user)
     babble_cache.set(babble.id, serialized_data)
+    # After commit, so a large fan-out does not hold the request's transaction
+    # open and followers never get an id they can not read yet.
+    transaction.on_commit(lambda: set_follower_cache(babble, user))
 
 
-def get_babbles_from_cache(user_cache_data: Dict, user: User, next: int) -> List[Dict]:
-    cached_babbles = []
-    non_cached_babbles = []
-
-    start = next if next else 0
-    user_cache_data = dict(list(user_cache_data.items())[start : start + 5])
+def get_babbles_from_cache(
+    babble_ids: List[int], user: User, pushed_ids: Set[int]
+) -> List[Dict]:
+    babbles_by_id = babble_cache.get_or_build_many(babble_ids, build_babbles)
 
-    babble_ids = list(user_cache_data.keys())
-    babbles_from_cache = babble_cache.get_many(babble_ids)
+    # Babbles deleted since they were pushed.
+    timelines.remove(user.id, [id for id in babble_ids if id not in babbles_by_id])
 
-    for id, value in user_cache_data.items():
-        babble = babbles_from_cache.get(id)
+    flags = timelines.get_flags(user.id, [id for id in babble_ids if id in pushed_ids])
+    babbles = []
+    for id in babble_ids:
+        babble = babbles_by_id.get(id)
         if babble:
-            babble.update(value)
-            cached_babbles.append(babble)
-        else:
-            non_cached_babbles.append(id)
+            babble.update(flags.get(id, {}))
+            babbles.append(babble)
 
-    non_cached_babbles = get_non_cached_babbles(non_cached_babbles, user)
-    babbles = cached_babbles + non_cached_babbles
-    return sorted(babbles, key=lambda x: x["created"], reverse=True)
+    # The flag hash only covers pushed babbles.
+    pulled = [babble for babble in babbles if babble["id"] not in pushed_ids]
+    check_viewer_state(pulled, user)
 
+    return babbles
 
-def remove_non_existing_babbles(
-    non_cached_babbles: List,
-    serialized_data: List[Dict],
-    user: User,
-    user_cache_data: Dict,
-) -> None:
-    serialized_babble_ids = {babble["id"] for babble in serialized_data}
-    non_exist_babbles = set(non_cached_babbles) - serialized_babble_ids
 
-    for id in non_exist_babbles:
-        user_cache_data.pop(id, None)
-    user_cache.set(user.id, user_cache_data)
+def rebuild_once(
+    key: str, build: Callable[[], None], read: Callable[[], Optional[timelines.Feed]]
+) -> Optional[timelines.Feed]:
+    """Rebuild a missing timeline or outbox in one request at a time; the
+    others wait for it instead of all querying the database."""
 
+    def rebuild() -> Optional[timelines.Feed]:
+        build()
+        return read()
 
-def set_babbles_cache(serialized_data: List[Dict]) -> None:
-    babble_data = {babble["id"]: babble for babble in serialized_data}
-    babble_cache.set_many(babble_data)
+    return single_flight(
+        timelines.get_connection(),
+        key,
+        rebuild,
+        read,
+        settings.CACHE_REBUILD["LOCK_TIMEOUT"],
+        settings.CACHE_REBUILD["WAIT"],
+    )
 
 
-def update_serialized_data(
-    serialized_data: List[Dict], user_cache_data: Dict
-) -> List[Dict]:
-    for babble in serialized_data:
-        data = user_cache_data.get(babble["id"])
-        babble.update(data)
+def build_outbox(author_id: int) -> None:
+    babbles = list(
+        Babble.objects.filter(user_id=author_id)
+        .order_by("-created", "-id")
+        .values_list("id", "created")[: settings.TIMELINE_SIZE]
+    )
+    timelines.store_outbox(author_id, babbles)
 
-    return serialized_data
 
+def get_pull_authors(user: User) -> List[int]:
+    return list(
+        user.self.filter(
+            following__follower_count__gte=settings.FEED_PULL_THRESHOLD
+        ).values_list("following_id", flat=True)
+    )
 
-def get_non_cached_babbles(non_cached_babbles: List[int], user: User) -> List[dict]:
-    if not non_cached_babbles:
-        return []
 
-    babbles = Babble.objects.filter(id__in=non_cached_babbles).order_by("-created")
-    serializer = BabbleSerializer(babbles, many=True)
-    serialized_data = serializer.data
+def get_outboxes(
+    author_ids: List[int], count: int, before: Optional[Position]
+) -> List[timelines.Feed]:
+    outboxes = timelines.read_outboxes(author_ids, count, before)
+
+    for author_id, feed in outboxes.items():
+        if feed is None:
+            outboxes[author_id] = rebuild_once(
+                timelines.outbox_key(author_id),
+                lambda: build_outbox(author_id),
+                lambda: timelines.read_outboxes([author_id], count, before)[author_id],
+            )
+
+    return [feed for feed in outboxes.values() if feed is not None]
+
+
+def get_timeline(
+    user: User, cursor: Optional[Position]
+) -> Tuple[List[Dict], Optional[Position]]:
+    """One page of the home feed after ``cursor`` and the cursor of the next
+    page, or None on the last page."""
+    pushed = timelines.read(user.id, PAGE_SIZE + 1, cursor)
+    if pushed is None:
+        pushed = rebuild_once(
+            timelines.timeline_key(user.id),
+            lambda: build_timeline(user),
+            lambda: timelines.read(user.id, PAGE_SIZE + 1, cursor),
+        )
+    feeds = [pushed or timelines.Feed([], None)]
+    feeds += get_outboxes(get_pull_authors(user), PAGE_SIZE + 1, cursor)
+
+    # Past the oldest entry of a trimmed feed the cache may miss babbles, so
+    # the rest of the page comes from the database.
+    horizon = max((feed.horizon for feed in feeds if feed.horizon), default=None)
+    entries = [
+        entry
+        for entry in timelines.merge(*(feed.entries for feed in feeds))
+        if horizon is None or entry >= horizon
+    ]
+    page = entries[:PAGE_SIZE]
+
+    babbles = get_babbles_from_cache(
+        [id for _, id in page], user, {id for _, id in feeds[0].entries}
+    )
+    has_more = len(entries) > PAGE_SIZE or horizon is not None
+    next_cursor = page[-1] if page and has_more else None
 
-    user_cache_data = user_cache.get(user.id)
+    if len(page) < PAGE_SIZE and horizon is not None:
+        more, next_cursor = get_babbles_from_db(
+            user, page[-1] if page else cursor, PAGE_SIZE - len(page)
+        )
+        babbles += more
 
-    set_babbles_cache(serialized_data)
-    remove_non_existing_babbles(
-        non_cached_babbles, serialized_data, user, user_cache_data
-    )
+    return babbles, next_cursor
 
-    serialized_data = update_serialized_data(serialized_data, user_cache_data)
 
-    return serialized_data
+def set_babbles_cache(serialized_data: List[Dict]) -> None:
+    babble_data = {babble["id"]: babble for babble in serialized_data}
+    babble_cache.set_many(babble_data)
 
 
-def get_babbles_from_db(user: User, next: int) -> List[Babble]:
-    start = 0
-    end = 20
+def build_babbles(babble_ids: List[int]) -> Dict[int, Dict]:
+    babbles = (
+        Babble.objects.filter(id__in=babble_ids)
+        .select_related("user")
+        .prefetch_related("tags")
+    )
+    serializer = BabbleSerializer(babbles, many=True)
+    return {babble["id"]: babble for babble in serializer.data}
 
-    if next >= 20:
-        start = next
-        end = start + 5
 
-    followings = user.self.all().values_list("following__id", flat=True)
+def build_timeline(user: User) -> None:
+    followings = user.self.filter(
+        following__follower_count__lt=settings.FEED_PULL_THRESHOLD
+    ).values_list("following__id", flat=True)
 
     babbles = (
         Babble.objects.filter(Q(user__in=followings) | Q(user=user))
         .select_related("user")
         .prefetch_related("tags")
-        .order_by("-created")[start:end]
+        .order_by("-created", "-id")[: settings.TIMELINE_SIZE]
     )
 
     serializer = BabbleSerializer(babbles, many=True)
@@ -191,19 +248,39 @@ def get_babbles_from_db(user: User, next: int) -> List[Babble]:
 
     set_babbles_cache(serialized_data)
 
-    serialized_data = check_rebabbled(serialized_data, user)
-    serialized_data = check_liked(serialized_data, user)
+    state = get_viewer_state(user, [babble["id"] for babble in serialized_data])
+
+    timelines.store(
+        user.id,
+        [(babble.id, babble.created) for babble in serializer.instance],
+        state,
+    )
+
 
-    data = {}
-    for babble in serialized_data:
-        data[babble["id"]] = {
-            "is_rebabbled": babble["is_rebabbled"],
-            "is_liked": babble["is_liked"],
-        }
+def get_babbles_from_db(
+    user: User, cursor: Optional[Position], count: int
+) -> Tuple[List[Dict], Optional[Position]]:
+    followings = user.self.all().values_list("following__id", flat=True)
 
-    user_cache.set(user.id, data)
+    babbles = Babble.objects.filter(Q(user__in=followings) | Q(user=user))
+    if cursor is not None:
+        created = created_of(cursor)
+        babbles = babbles.filter(
+            Q(created__lt=created) | Q(created=created, id__lt=cursor[1])
+        )
+    babbles = list(
+        babbles.select_related("user")
+        .prefetch_related("tags")
+        .order_by("-created", "-id")[: count + 1]
+    )
 
-    return serialized_data[0:5]
+    next_cursor = None
+    if len(babbles) > count:
+        babbles = babbles[:count]
+        next_cursor = position_of(babbles[-1].created, babbles[-1].id)
+
+    serializer = BabbleSerializer(babbles, many=True)
+    return check_viewer_state(serializer.data, user), next_cursor
 
 
 def get_user(request: HttpRequest, pk: Optional[str] = None) -> User:
@@ -1,39 +1,33 @@
 import logging
 from typing import Optional, Type
 
-from django.core.cache import caches
 from django.db import transaction
 from django.db.models.manager import BaseManager
 from django.http import Http404, HttpRequest
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from babbles import babble_cache, counters, timelines
+from babbles.jobs import check_queue_capacity, enqueue_transcription
 from babbles.models import Babble
 from babbles.serializers import BabbleSerializer
 from babbles.utils import (
-    check_liked,
-    check_rebabbled,
-    get_babbles_from_cache,
-    get_babbles_from_db,
+    build_babbles,
+    get_timeline,
     get_user,
-    save_keywords,
     set_caches,
     set_follower_cache,
 )
-from likes.models import Like
+from core.pagination import decode_cursor, encode_cursor
+from core.utils import upload_hash
+from core.viewer import check_viewer_state, get_viewer_state
 from notifications.utils import send_message_to_followers
-from rebabbles.models import Rebabble
 
 logger = logging.getLogger(__name__)
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-
-user_cache.clear()
-babble_cache.clear()
-
 
 class BabbleViewSet(viewsets.ViewSet):
     queryset: BaseManager[Babble] = Babble.objects.all()
@@ -43,9 +37,10 @@ class BabbleViewSet(viewsets.ViewSet):
     def create(self, request: HttpRequest) -> Response:
         serializer = BabbleSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        check_queue_capacity()
 
-        babble = serializer.save(user=request.user)
-        babble = save_keywords(babble)
+        babble = serializer.save(user=request.user, status=Babble.PROCESSING)
+        enqueue_transcription(babble)
         serializer = BabbleSerializer(babble)
         set_caches(babble, request.user, serializer.data)
 
@@ -57,7 +52,7 @@ class BabbleViewSet(viewsets.ViewSet):
             {
                 "user": request.user.username,
                 "babble_id": babble.id,
-                "tag": serializer.data["tags"],
+                "status": babble.status,
             }
         )
 
@@ -65,17 +60,13 @@ class BabbleViewSet(viewsets.ViewSet):
 
     def retrieve(self, request: HttpRequest, pk: Optional[str] = None) -> Response:
         pk = int(pk)
-        babble_data = babble_cache.get(pk)
+        babble_data = babble_cache.get_or_build_many([pk], build_babbles).get(pk)
 
         if babble_data is None:
-            babble = Babble.objects.get_or_404(id=pk)
-            babble_data = BabbleSerializer(babble).data
-            babble_cache.set(pk, babble_data)
+            raise Http404
 
-        is_rebabbled = Rebabble.objects.filter(user=request.user, babble=pk).exists()
-        is_liked = Like.objects.filter(user=request.user, babble=pk).exists()
-        babble_data["is_rebabbled"] = is_rebabbled
-        babble_data["is_liked"] = is_liked
+        babble_data.update(get_viewer_state(request.user, [pk])[pk])
+        counters.apply([babble_data])
 
         return Response(babble_data, status=status.HTTP_200_OK)
 
@@ -87,39 +78,43 @@ class BabbleViewSet(viewsets.ViewSet):
         serializer = BabbleSerializer(babble, data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        babble = serializer.save()
-        babble = save_keywords(babble)
+        # Metadata-only edits and re-uploads of the same clip keep the
+        # stored transcript and tags.
+        audio = request.data.get("audio")
+        if audio and upload_hash(audio) != babble.audio_hash:
+            check_queue_capacity()
+            babble = serializer.save(status=Babble.PROCESSING)
+            enqueue_transcription(babble, is_update=True)
+        else:
+            babble = serializer.save()
         set_follower_cache(babble, request.user)
         serializer = BabbleSerializer(babble)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(counters.apply([serializer.data])[0], status=status.HTTP_200_OK)
 
     @transaction.atomic
     def destroy(self, request: HttpRequest, pk: Optional[str] = None) -> Response:
         pk = int(pk)
         babble_cache.delete(pk)
+        timelines.remove_from_outbox(request.user.id, pk)
         Babble.objects.filter(id=pk).delete()
 
         return Response(status=status.HTTP_200_OK)
 
     def list(self, request: HttpRequest) -> Response:
         user = get_user(request)
-        user_cache_data = user_cache.get(user.id)
-        next = int(request.query_params.get("next") or 0)
-
-        if user_cache_data:
-            serialized_data = get_babbles_from_cache(user_cache_data, user, next)
-        else:
-            serialized_data = get_babbles_from_db(user, next)
+        cursor = decode_cursor(request.query_params.get("next"))
+        timelines.mark_active(request.user.id)
+        serialized_data, next_cursor = get_timeline(user, cursor)
 
         if user != request.user:
-            serialized_data = check_rebabbled(serialized_data, request.user)
-            serialized_data = check_liked(serialized_data, request.user)
+            serialized_data = check_viewer_state(serialized_data, request.user)
+        serialized_data = counters.apply(serialized_data)
 
         return Response(
             {
                 "results": serialized_data,
-                "next": next + 5,
+                "next": encode_cursor(next_cursor),
             },
             status=status.HTTP_200_OK,
         )
@@ -134,8 +129,9 @@ class BabbleViewSet(viewsets.ViewSet):
             raise Http404
 
         serializer = BabbleSerializer(query, many=True)
-        serialized_data = check_rebabbled(serializer.data, request.user)
-        serialized_data = check_liked(serialized_data, request.user)
+        serialized_data = counters.apply(
+            check_viewer_state(serializer.data, request.user)
+        )
 
         return pagenator.get_paginated_response(serialized_data)
 
@@ -150,7 +146,18 @@ class BabbleViewSet(viewsets.ViewSet):
             raise Http404
 
         serializer = BabbleSerializer(query, many=True)
-        serialized_data = check_rebabbled(serializer.data, request.user)
-        serialized_data = check_liked(serialized_data, request.user)
+        serialized_data = counters.apply(
+            check_viewer_state(serializer.data, request.user)
+        )
 
         return pagenator.get_paginated_response(serialized_data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=[IsAdminUser],
+    )
+    def cache_stats(self, request: HttpRequest) -> Response:
+        # Hit ratios of this worker process only.
+        return Response(babble_cache.stats(), status=status.HTTP_200_OK)
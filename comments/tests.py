@@ -1,9 +1,11 @@
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from babbles import counters
 from babbles.models import Babble
 from comments.models import Comment
 from users.models import User
@@ -11,6 +13,8 @@ from users.models import User
 
 class CommentViewSetTestCase(APITestCase):
     def setUp(self):
+        # Pending counts of reused babble ids must not leak between tests.
+        caches["default"].clear()
         self.user1 = User.objects.create_user(
             username="user1", password="user1_password"
         )
@@ -45,9 +49,11 @@ class CommentViewSetTestCase(APITestCase):
     def test_create_comment(self):
         with open("test.mp3", "rb") as test_audio_file:
             data = {"audio": test_audio_file}
-            response = self.client.post(self.comment_url, data)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.comment_url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Comment.objects.filter(user=self.user1).count(), 2)
+        counters.flush()
         self.babble1.refresh_from_db()
         self.assertEqual(self.babble1.comment_count, 2)
 
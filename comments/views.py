@@ -1,22 +1,17 @@
 from typing import Optional
 
-from django.core.cache import caches
 from django.db import transaction
-from django.db.models import F
 from django.http import Http404, HttpRequest
 from rest_framework import status, viewsets
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from babbles import counters
 from babbles.models import Babble
 from comments.models import Comment
 from comments.serializers import CommentSerializer
-from comments.utils import update_babble_cache
 from notifications.utils import send_message_to_user
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-
 
 class CommentViewSet(viewsets.ViewSet):
     queryset = Comment.objects.all()
@@ -30,8 +25,7 @@ class CommentViewSet(viewsets.ViewSet):
         serializer.is_valid(raise_exception=True)
         comment = serializer.save(user=request.user, babble=babble)
 
-        babble.comment_count += 1
-        babble.save()
+        counters.incr_on_commit(babble.id, "comment_count", 1)
 
         send_message_to_user(
             request.user.id,
@@ -39,7 +33,6 @@ class CommentViewSet(viewsets.ViewSet):
             f"{request.user.username} commented on your babble {babble.id}.",
         )
 
-        update_babble_cache(babble_id, "comment_count", 1)
         return Response(
             CommentSerializer(comment).data,
             status=status.HTTP_201_CREATED,
@@ -67,10 +60,9 @@ class CommentViewSet(viewsets.ViewSet):
         babble_id: Optional[str] = None,
         pk: Optional[str] = None,
     ) -> Response:
-        Babble.objects.filter(id=babble_id).update(comment_count=F("comment_count") - 1)
-        Comment.objects.filter(id=pk).delete()
-
-        update_babble_cache(babble_id, "comment_count", -1)
+        deleted, _ = Comment.objects.filter(id=pk).delete()
+        if deleted:
+            counters.incr_on_commit(int(babble_id), "comment_count", -1)
 
         return Response(status=status.HTTP_200_OK)
 
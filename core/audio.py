@@ -0,0 +1,187 @@
+import subprocess
+import wave
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def read_wav(path: str, start: float = 0.0) -> Optional[np.ndarray]:
+    """The samples after ``start`` seconds of a 16 kHz mono 16-bit WAV file,
+    read without ffmpeg; None for anything else. Files that are still being
+    uploaded are read up to their current end."""
+    try:
+        with wave.open(str(path), "rb") as f:
+            if (f.getnchannels(), f.getsampwidth(), f.getframerate()) != (
+                1,
+                2,
+                SAMPLE_RATE,
+            ):
+                return None
+            f.setpos(min(int(start * SAMPLE_RATE), f.getnframes()))
+            frames = f.readframes(f.getnframes())
+    except (wave.Error, EOFError):
+        return None
+
+    # A chunk may end half way through a sample.
+    return (
+        np.frombuffer(frames[: len(frames) // 2 * 2], np.int16).astype(np.float32)
+        / 32768.0
+    )
+
+
+def decode(path: str, start: float = 0.0) -> np.ndarray:
+    """Decode any container ffmpeg understands to 16 kHz mono float32 PCM.
+
+    ``start`` skips the first seconds without decoding them: ffmpeg seeks
+    in the input, to the nearest frame for compressed formats.
+    """
+    audio = read_wav(path, start)
+    if audio is not None:
+        return audio
+
+    seek = ["-ss", str(start)] if start > 0 else []
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-threads",
+        "0",
+        *seek,
+        "-i",
+        path,
+        "-f",
+        "s16le",
+        "-ac",
+        "1",
+        "-acodec",
+        "pcm_s16le",
+        "-ar",
+        str(SAMPLE_RATE),
+        "-",
+    ]
+    output = subprocess.run(command, capture_output=True, check=True).stdout
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Duration from the container header, without decoding the audio."""
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration",
+        "-of",
+        "default=noprint_wrappers=1:nokey=1",
+        path,
+    ]
+    try:
+        output = subprocess.run(command, capture_output=True, check=True, text=True)
+        return float(output.stdout.strip())
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def speech_segments(
+    audio: np.ndarray,
+    threshold_db: float = -35.0,
+    min_silence_ms: int = 500,
+    padding_ms: int = 200,
+    frame_ms: int = 30,
+) -> List[Tuple[int, int]]:
+    """Sample ranges that contain speech, found by frame energy.
+
+    A frame is speech when its RMS is within ``threshold_db`` of the loudest
+    frame. Pauses shorter than ``min_silence_ms`` are kept inside a segment
+    and every segment is padded by ``padding_ms`` on both sides.
+    """
+    frame = SAMPLE_RATE * frame_ms // 1000
+    count = len(audio) // frame
+    if count == 0:
+        return []
+
+    frames = audio[: count * frame].reshape(count, frame)
+    rms = np.sqrt(np.mean(frames**2, axis=1))
+    peak = rms.max()
+    if peak == 0:
+        return []
+
+    voiced = np.flatnonzero(rms >= peak * 10 ** (threshold_db / 20))
+    max_gap = max(1, min_silence_ms // frame_ms)
+    padding = SAMPLE_RATE * padding_ms // 1000
+
+    segments = []
+    start = end = voiced[0]
+    for index in voiced[1:]:
+        if index - end > max_gap:
+            segments.append((start, end))
+            start = index
+        end = index
+    segments.append((start, end))
+
+    padded: List[Tuple[int, int]] = []
+    for start, end in segments:
+        start = max(0, int(start) * frame - padding)
+        end = min(len(audio), (int(end) + 1) * frame + padding)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+
+    return padded
+
+
+def closed_length(audio: np.ndarray, min_silence_ms: int = 500, **options) -> int:
+    """Length of the prefix whose speech is already followed by a pause.
+
+    Audio that is still being recorded or uploaded can be cut there without
+    splitting a word: every later sample belongs to speech that may go on.
+    """
+    segments = speech_segments(audio, min_silence_ms=min_silence_ms, **options)
+    min_silence = SAMPLE_RATE * min_silence_ms // 1000
+
+    closed = 0
+    for index, (start, end) in enumerate(segments):
+        if index + 1 < len(segments) or len(audio) - end >= min_silence:
+            closed = end
+    return closed
+
+
+def trim_silence(audio: np.ndarray, **options) -> np.ndarray:
+    segments = speech_segments(audio, **options)
+    if not segments:
+        return audio[:0]
+    return np.concatenate([audio[start:end] for start, end in segments])
+
+
+def split_chunks(audio: np.ndarray, max_seconds: float, **options) -> List[np.ndarray]:
+    """Speech-only chunks of at most ``max_seconds``, cut at silences.
+
+    Neighbouring speech segments are packed into one chunk while they fit;
+    a segment longer than a chunk is cut at the limit. Concatenated, the
+    chunks equal ``trim_silence(audio, **options)``.
+    """
+    limit = int(max_seconds * SAMPLE_RATE)
+    pieces = [
+        (offset, min(end, offset + limit))
+        for start, end in speech_segments(audio, **options)
+        for offset in range(start, end, limit)
+    ]
+
+    chunks, current, size = [], [], 0
+    for start, end in pieces:
+        if current and size + end - start > limit:
+            chunks.append(np.concatenate(current))
+            current, size = [], 0
+        current.append(audio[start:end])
+        size += end - start
+
+    if current:
+        chunks.append(np.concatenate(current))
+
+    return chunks
+
+
+def duration(audio: np.ndarray) -> float:
+    return len(audio) / SAMPLE_RATE
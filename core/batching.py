@@ -0,0 +1,83 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+
+class MicroBatcher:
+    """Groups single calls from many threads into one batched call.
+
+    Items are collected until ``max_size`` are waiting or ``max_wait`` seconds
+    have passed since the first one arrived, then ``func`` runs once on the
+    whole batch and every caller gets its own result back. ``func`` takes a
+    list and returns a list of results in the same order.
+    """
+
+    def __init__(
+        self, func: Callable[[List[Any]], List[Any]], max_size: int, max_wait: float
+    ) -> None:
+        self.func = func
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.queue: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+
+    def ensure_started(self) -> None:
+        # A thread started before fork does not exist in the child, so each
+        # process starts its own on first use.
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.queue = queue.Queue()
+            threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        if self.max_size <= 1:
+            future.set_result(self.func([item])[0])
+            return future
+
+        self.ensure_started()
+        self.queue.put((item, future))
+        return future
+
+    def __call__(self, item: Any) -> Any:
+        return self.submit(item).result()
+
+    def collect(self) -> List:
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def run(self) -> None:
+        while True:
+            batch = self.collect()
+            items = [item for item, _ in batch]
+
+            try:
+                results = self.func(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,104 @@
+import json
+import os
+import resource
+from typing import Callable, Dict, List
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def memory_breakdown(pid: str = "self") -> Dict[str, float]:
+    """Resident memory split into shared and private pages, in megabytes."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+
+    return {
+        "rss_mb": fields.get("Rss", 0.0),
+        "pss_mb": fields.get("Pss", 0.0),
+        "shared_mb": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private_mb": fields.get("Private_Clean", 0.0)
+        + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+
+    values = sorted(values)
+    index = (len(values) - 1) * q / 100
+    lower = int(index)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (index - lower)
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    total = sum(latencies)
+    return {
+        "count": len(latencies),
+        "mean": total / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "throughput": len(latencies) / total if total else 0.0,
+    }
+
+
+def run_in_child(func: Callable[[], Dict]) -> Dict:
+    """Run ``func`` in a forked process and return its JSON-able result.
+
+    Keeps models loaded by one measurement from inflating the memory numbers
+    of the next.
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            with os.fdopen(write_fd, "w") as f:
+                json.dump(func(), f)
+            status = 0
+        finally:
+            os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    _, status = os.waitpid(pid, 0)
+
+    if status != 0:
+        raise RuntimeError("benchmark child process failed")
+
+    return json.loads(data)
+
+
+def character_error_rate(reference: str, hypothesis: str) -> float:
+    """Levenshtein distance over characters, spaces ignored, divided by the
+    length of the reference. The usual accuracy measure for Korean STT."""
+    reference = reference.replace(" ", "")
+    hypothesis = hypothesis.replace(" ", "")
+    if not reference:
+        return float(bool(hypothesis))
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, expected in enumerate(reference, 1):
+        current = [i]
+        for j, actual in enumerate(hypothesis, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (expected != actual),
+                )
+            )
+        previous = current
+
+    return previous[-1] / len(reference)
@@ -0,0 +1,87 @@
+import threading
+from collections import Counter
+from typing import Any, Dict, List
+
+STATS_KEY = "cache:stats"
+
+
+def keyspace_of(key: str) -> str:
+    """The keyspace a key belongs to: its first segment, except "flags"
+    for timeline flag hashes and "django" for keys written through
+    Django's cache API (":1:name")."""
+    if key.endswith(":flags"):
+        return "flags"
+    return key.split(":", 1)[0] or "django"
+
+
+class KeyspaceStats:
+    """Hit and miss counts per keyspace.
+
+    Counted in process and added to the next pipeline that goes to Redis,
+    so reads do not pay an extra round trip for them. Stored without a TTL
+    so that volatile-* eviction never drops them.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.pending: Counter = Counter()
+
+    def count(self, keyspace: str, hits: int, misses: int) -> None:
+        with self.lock:
+            self.pending[f"{keyspace}:hits"] += hits
+            self.pending[f"{keyspace}:misses"] += misses
+
+    def write(self, pipeline: Any) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+
+        for field, amount in pending.items():
+            if amount:
+                pipeline.hincrby(STATS_KEY, field, amount)
+
+
+def read_stats(connections: List[Any]) -> Dict[str, Dict[str, float]]:
+    totals: Counter = Counter()
+    for connection in connections:
+        for field, amount in connection.hgetall(STATS_KEY).items():
+            totals[field.decode()] += int(amount)
+
+    stats = {}
+    for field in totals:
+        keyspace, _ = field.rsplit(":", 1)
+        hits = totals[f"{keyspace}:hits"]
+        misses = totals[f"{keyspace}:misses"]
+        stats[keyspace] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+        }
+    return stats
+
+
+def memory_by_keyspace(connection: Any, sample: int) -> Dict[str, Dict[str, float]]:
+    """Key count and estimated bytes per keyspace. MEMORY USAGE is asked
+    for up to ``sample`` keys of each keyspace and scaled to the count."""
+    keys: Dict[str, int] = Counter()
+    sampled: Dict[str, List[bytes]] = {}
+    for key in connection.scan_iter(count=1000):
+        keyspace = keyspace_of(key.decode())
+        keys[keyspace] += 1
+        if len(sampled.setdefault(keyspace, [])) < sample:
+            sampled[keyspace].append(key)
+
+    pipeline = connection.pipeline(transaction=False)
+    for keyspace_keys in sampled.values():
+        for key in keyspace_keys:
+            pipeline.memory_usage(key)
+    sizes = iter(pipeline.execute())
+
+    memory = {}
+    for keyspace, keyspace_keys in sampled.items():
+        used = [size or 0 for size in (next(sizes) for _ in keyspace_keys)]
+        average = sum(used) / len(used) if used else 0.0
+        memory[keyspace] = {
+            "keys": keys[keyspace],
+            "bytes": average * keys[keyspace],
+        }
+    return memory
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from core.nouns import get_extractor
+
+ELECTRA_MODEL = "monologg/koelectra-base-finetuned-nsmc"
+
+
+def quantize_linear(model: Any) -> Any:
+    """Dynamic int8 quantization of every Linear layer, for CPU inference."""
+    import torch
+
+    for module in model.modules():
+        # Whisper wraps nn.Linear in a subclass that only casts dtypes, which
+        # quantize_dynamic would not recognise.
+        if isinstance(module, torch.nn.Linear):
+            module.__class__ = torch.nn.Linear
+
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+class Engine:
+    """The models behind STT: transcription, sentiment and noun extraction.
+
+    Models are loaded on first use. ``version`` identifies the outputs an
+    engine produces and is part of every transcription cache key.
+    """
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self.models: Dict[str, Any] = {}
+        self.lock = threading.RLock()
+
+    @property
+    def version(self) -> str:
+        return self.name
+
+    def load_model(self, name: str, loader: Callable[[], Any]) -> Any:
+        with self.lock:
+            if name not in self.models:
+                self.models[name] = loader()
+            return self.models[name]
+
+    def load(self) -> None:
+        pass
+
+    def transcribe(self, audio: Any) -> str:
+        raise NotImplementedError
+
+    def classify(self, text: str) -> str:
+        raise NotImplementedError
+
+    def classify_batch(self, texts: List[str]) -> List[str]:
+        return [self.classify(text) for text in texts]
+
+    def nouns(self, text: str) -> List[str]:
+        return get_extractor().nouns(text)
+
+
+class WhisperEngine(Engine):
+    name = "whisper"
+
+    def __init__(
+        self,
+        model: str = "small",
+        sentiment_model: str = ELECTRA_MODEL,
+        device: str = "cpu",
+        quantize: bool = False,
+    ) -> None:
+        super().__init__()
+        self.model = model
+        self.sentiment_model = sentiment_model
+        self.device = device
+        self.quantize = quantize
+
+    @property
+    def version(self) -> str:
+        suffix = "-int8" if self.quantize else ""
+        return (
+            f"{self.name}-{self.model}{suffix}:{self.sentiment_model}{suffix}"
+            f":{get_extractor().name}"
+        )
+
+    def load_transcriber(self) -> Any:
+        import whisper
+
+        model = whisper.load_model(self.model, device=self.device)
+        return quantize_linear(model) if self.quantize else model
+
+    def load_analyzer(self) -> Any:
+        from transformers import (
+            ElectraForSequenceClassification,
+            ElectraTokenizer,
+            pipeline,
+        )
+
+        tokenizer = ElectraTokenizer.from_pretrained(self.sentiment_model)
+        electra_model = ElectraForSequenceClassification.from_pretrained(
+            self.sentiment_model
+        )
+        if self.quantize:
+            electra_model = quantize_linear(electra_model)
+        return pipeline("sentiment-analysis", tokenizer=tokenizer, model=electra_model)
+
+    @property
+    def transcriber(self) -> Any:
+        return self.load_model("transcriber", self.load_transcriber)
+
+    @property
+    def analyzer(self) -> Any:
+        return self.load_model("analyzer", self.load_analyzer)
+
+    def load(self) -> None:
+        # Noun extraction is left out on purpose: Okt's JVM does not survive
+        # fork, so every worker process starts its own on first use.
+        self.transcriber
+        self.analyzer
+
+    def transcribe(self, audio: Any) -> str:
+        result = self.transcriber.transcribe(audio, fp16=False)
+        return result["text"]
+
+    def classify(self, text: str) -> str:
+        return self.analyzer(text)[0]["label"]
+
+    def classify_batch(self, texts: List[str]) -> List[str]:
+        results = self.analyzer(texts, batch_size=len(texts))
+        return [result["label"] for result in results]
+
+
+class FasterWhisperEngine(WhisperEngine):
+    """Whisper on CTranslate2 with int8 weights.
+
+    Several times the throughput of ``WhisperEngine`` on CPU for a small loss
+    in accuracy. Needs the ``faster-whisper`` package. ``quantize`` forces
+    ``compute_type`` to int8.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(
+        self,
+        compute_type: str = "int8",
+        beam_size: int = 1,
+        cpu_threads: int = 0,
+        **options: Any,
+    ) -> None:
+        super().__init__(**options)
+        self.compute_type = "int8" if self.quantize else compute_type
+        self.beam_size = beam_size
+        self.cpu_threads = cpu_threads
+
+    @property
+    def version(self) -> str:
+        suffix = "-int8" if self.quantize else ""
+        return (
+            f"{self.name}-{self.model}-{self.compute_type}-b{self.beam_size}"
+            f":{self.sentiment_model}{suffix}:{get_extractor().name}"
+        )
+
+    def load_transcriber(self) -> Any:
+        from faster_whisper import WhisperModel
+
+        return WhisperModel(
+            self.model,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+        )
+
+    def transcribe(self, audio: Any) -> str:
+        segments, _ = self.transcriber.transcribe(audio, beam_size=self.beam_size)
+        return "".join(segment.text for segment in segments)
+
+
+class FakeEngine(Engine):
+    """Returns canned results instantly. Meant for tests and local development."""
+
+    name = "fake"
+
+    def __init__(
+        self,
+        transcript: str = "오늘 날씨 정말 좋다 오늘 공원 산책",
+        label: str = "positive",
+    ) -> None:
+        super().__init__()
+        self.transcript = transcript
+        self.label = label
+
+    @property
+    def version(self) -> str:
+        digest = hashlib.md5(self.transcript.encode()).hexdigest()[:8]
+        return f"{self.name}-{self.label}-{digest}"
+
+    def transcribe(self, audio: Any) -> str:
+        return self.transcript
+
+    def classify(self, text: str) -> str:
+        return self.label
+
+    def nouns(self, text: str) -> List[str]:
+        return text.split()
+
+
+def get_engine() -> Engine:
+    config = settings.STT_ENGINE
+    engine_class = import_string(config["BACKEND"])
+    return engine_class(**config.get("OPTIONS", {}))
@@ -0,0 +1,23 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException, Throttled
+
+
+class QueueFull(Throttled):
+    default_detail = "Too many babbles are waiting for transcription."
+    default_code = "queue_full"
+
+
+class ServiceUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Transcription is temporarily unavailable."
+    default_code = "service_unavailable"
+
+    def __init__(self, wait=None, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class OffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Upload-Offset does not match the bytes received so far."
+    default_code = "offset_mismatch"
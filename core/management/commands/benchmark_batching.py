@@ -0,0 +1,88 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.batching import MicroBatcher
+from core.benchmarks import summarize
+from core.engines import get_engine
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "fixtures" / "stt"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sentiment throughput with and without micro-batching at "
+        "several numbers of concurrent callers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sentences", default=str(FIXTURES_DIR / "sentences.txt"))
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument(
+            "--max-size",
+            type=int,
+            default=settings.STT_SENTIMENT_BATCH["MAX_SIZE"],
+        )
+        parser.add_argument(
+            "--max-wait-ms",
+            type=float,
+            default=settings.STT_SENTIMENT_BATCH["MAX_WAIT_MS"],
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--json", action="store_true")
+
+    def measure(self, batcher: MicroBatcher, sentences, concurrency: int) -> dict:
+        latencies = []
+
+        def classify(sentence):
+            start = time.perf_counter()
+            batcher(sentence)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(classify, sentences))
+        elapsed = time.perf_counter() - start
+
+        return {
+            **summarize(latencies),
+            "throughput": len(sentences) / elapsed,
+            "avg_batch": batcher.items / batcher.batches if batcher.batches else 1.0,
+        }
+
+    def handle(self, *args, **options):
+        with open(options["sentences"], encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+        sentences *= options["repeat"]
+
+        engine = get_engine()
+        engine.load()
+        engine.classify_batch(sentences[:1])
+
+        results = []
+        for concurrency in options["concurrency"]:
+            for mode, max_size in (("single", 1), ("batched", options["max_size"])):
+                batcher = MicroBatcher(
+                    engine.classify_batch,
+                    max_size=max_size,
+                    max_wait=options["max_wait_ms"] / 1000,
+                )
+                result = self.measure(batcher, sentences, concurrency)
+                results.append({"mode": mode, "concurrency": concurrency, **result})
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['mode']:>8} x{result['concurrency']:<3} "
+                f"{result['throughput']:8.1f} texts/s  "
+                f"p50 {result['p50'] * 1000:7.1f} ms  "
+                f"p95 {result['p95'] * 1000:7.1f} ms  "
+                f"avg batch {result['avg_batch']:.1f}"
+            )
@@ -0,0 +1,100 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.benchmarks import summarize
+from core.nouns import build_extractor
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "fixtures" / "stt"
+
+BACKENDS = {
+    "okt": "core.nouns.OktExtractor",
+    "mecab": "core.nouns.MecabExtractor",
+    "simple": "core.nouns.SimpleExtractor",
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-call noun extraction latency for each backend, cold and "
+        "cached, and how often its tags agree with Okt."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sentences", default=str(FIXTURES_DIR / "sentences.txt"))
+        parser.add_argument(
+            "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=settings.STT_NOUNS.get("OPTIONS", {}).get("pool_size", 4),
+        )
+        parser.add_argument("--json", action="store_true")
+
+    def measure(self, extract, sentences, concurrency: int) -> dict:
+        latencies = []
+
+        def call(sentence):
+            start = time.perf_counter()
+            extract(sentence)
+            latencies.append(time.perf_counter() - start)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(call, sentences))
+
+        return summarize(latencies)
+
+    def tags(self, extractor, sentence: str) -> set:
+        return {noun for noun in extractor.extract(sentence) if len(noun) > 1}
+
+    def handle(self, *args, **options):
+        with open(options["sentences"], encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+
+        extractors = {}
+        for name in options["backends"]:
+            try:
+                extractor = build_extractor(BACKENDS[name])
+                # Starts the JVM or loads the dictionary outside the timings.
+                extractor.extract(sentences[0])
+            except Exception as e:
+                self.stderr.write(f"{name}: skipped ({e})")
+                continue
+            extractors[name] = extractor
+
+        reference = extractors.get("okt")
+        results = []
+        for name, extractor in extractors.items():
+            cold = self.measure(extractor.extract, sentences, options["concurrency"])
+            extractor.nouns(sentences[0])
+            cached = self.measure(extractor.nouns, sentences, options["concurrency"])
+
+            result = {"backend": name, "cold": cold, "cached": cached}
+            if reference is not None:
+                overlaps = []
+                for sentence in sentences:
+                    expected = self.tags(reference, sentence)
+                    actual = self.tags(extractor, sentence)
+                    union = expected | actual
+                    overlaps.append(len(expected & actual) / len(union) if union else 1)
+                result["agreement"] = sum(overlaps) / len(overlaps)
+            results.append(result)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            agreement = result.get("agreement")
+            self.stdout.write(
+                f"{result['backend']:>7}  "
+                f"cold p50 {result['cold']['p50'] * 1000:7.3f} ms  "
+                f"p95 {result['cold']['p95'] * 1000:7.3f} ms  "
+                f"cached p50 {result['cached']['p50'] * 1000:7.4f} ms  "
+                + (f"agreement {agreement:.0%}" if agreement is not None else "")
+            )
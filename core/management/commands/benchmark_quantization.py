@@ -0,0 +1,153 @@
+import json
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from core.benchmarks import memory_breakdown, run_in_child, summarize
+from core.engines import WhisperEngine
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "fixtures" / "stt"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the configured engine in fp32 and with dynamic int8 "
+        "quantization: latency, throughput, memory and agreement with fp32."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sentences",
+            default=str(FIXTURES_DIR / "sentences.txt"),
+            help="One sentence per line, used for the sentiment model.",
+        )
+        parser.add_argument(
+            "--audio-dir",
+            help="Directory of audio clips to transcribe. Transcription is "
+            "skipped when omitted.",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--json", action="store_true")
+
+    def measure(
+        self, quantize: bool, sentences: List[str], audio_paths: List[str], repeat: int
+    ) -> Dict:
+        config = settings.STT_ENGINE
+        engine_class = import_string(config["BACKEND"])
+        engine = engine_class(**{**config.get("OPTIONS", {}), "quantize": quantize})
+
+        rss_before = memory_breakdown()["rss_mb"]
+        start = time.perf_counter()
+        engine.load()
+        result = {
+            "load_seconds": time.perf_counter() - start,
+            "model_rss_mb": memory_breakdown()["rss_mb"] - rss_before,
+        }
+
+        labels, latencies = [], []
+        for _ in range(repeat):
+            labels = []
+            for sentence in sentences:
+                start = time.perf_counter()
+                labels.append(engine.classify(sentence))
+                latencies.append(time.perf_counter() - start)
+        result["sentiment"] = {**summarize(latencies), "outputs": labels}
+
+        transcripts, latencies = [], []
+        for path in audio_paths:
+            start = time.perf_counter()
+            transcripts.append(engine.transcribe(path))
+            latencies.append(time.perf_counter() - start)
+        result["transcription"] = {**summarize(latencies), "outputs": transcripts}
+
+        return result
+
+    def agreement(self, baseline: Dict, candidate: Dict) -> Dict:
+        labels = list(
+            zip(baseline["sentiment"]["outputs"], candidate["sentiment"]["outputs"])
+        )
+        transcripts = list(
+            zip(
+                baseline["transcription"]["outputs"],
+                candidate["transcription"]["outputs"],
+            )
+        )
+        return {
+            "sentiment_label_match": (
+                sum(a == b for a, b in labels) / len(labels) if labels else None
+            ),
+            "transcript_exact_match": (
+                sum(a == b for a, b in transcripts) / len(transcripts)
+                if transcripts
+                else None
+            ),
+            "transcript_similarity": (
+                sum(SequenceMatcher(None, a, b).ratio() for a, b in transcripts)
+                / len(transcripts)
+                if transcripts
+                else None
+            ),
+        }
+
+    def handle(self, *args, **options):
+        if not issubclass(import_string(settings.STT_ENGINE["BACKEND"]), WhisperEngine):
+            raise CommandError("STT_ENGINE does not support quantization.")
+
+        config = settings.STT_ENGINE
+        engine = import_string(config["BACKEND"])(
+            **{**config.get("OPTIONS", {}), "quantize": False}
+        )
+        if options["audio_dir"] and getattr(engine, "compute_type", None) == "int8":
+            raise CommandError(
+                f"{engine.name} already transcribes with compute_type int8, so "
+                "both runs would be the same model. Set its compute_type to "
+                "float32 in STT_ENGINE to compare it with int8."
+            )
+
+        with open(options["sentences"], encoding="utf-8") as f:
+            sentences = [line.strip() for line in f if line.strip()]
+
+        audio_paths = []
+        if options["audio_dir"]:
+            audio_paths = sorted(
+                str(path) for path in Path(options["audio_dir"]).iterdir()
+            )
+
+        results = {
+            mode: run_in_child(
+                lambda quantize=quantize: self.measure(
+                    quantize, sentences, audio_paths, options["repeat"]
+                )
+            )
+            for mode, quantize in (("fp32", False), ("int8", True))
+        }
+        results["agreement"] = self.agreement(results["fp32"], results["int8"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+
+        for mode in ("fp32", "int8"):
+            result = results[mode]
+            self.stdout.write(
+                f"{mode}: load {result['load_seconds']:.1f}s, "
+                f"models {result['model_rss_mb']:.0f} MB"
+            )
+            for stage in ("sentiment", "transcription"):
+                stats = result[stage]
+                if not stats["count"]:
+                    continue
+                self.stdout.write(
+                    f"  {stage}: p50 {stats['p50'] * 1000:.1f} ms, "
+                    f"p95 {stats['p95'] * 1000:.1f} ms, "
+                    f"{stats['throughput']:.1f} items/s"
+                )
+
+        for name, value in results["agreement"].items():
+            if value is not None:
+                self.stdout.write(f"{name}: {value:.1%}")
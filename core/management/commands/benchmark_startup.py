@@ -0,0 +1,102 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Each mode runs in a fresh interpreter so imports and model weights from one
+# measurement cannot leak into the next.
+SCRIPT = """
+import json, os, sys, time
+
+start = time.perf_counter()
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "audiotwitter.settings")
+django.setup()
+
+import audiotwitter.urls
+from core.benchmarks import memory_breakdown, peak_rss_mb
+from core.stt import get_stt
+
+mode = sys.argv[1]
+if mode in ("eager", "fork"):
+    get_stt().preload()
+
+result = {"mode": mode, "seconds": time.perf_counter() - start}
+
+if mode == "fork":
+    read_fd, write_fd = os.pipe()
+    if os.fork() == 0:
+        os.write(write_fd, json.dumps(memory_breakdown()).encode())
+        os._exit(0)
+    os.close(write_fd)
+    os.wait()
+    result["child"] = json.loads(os.read(read_fd, 4096))
+
+result["peak_rss_mb"] = peak_rss_mb()
+print(json.dumps(result))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure start-up time and memory of a process that imports the URLconf "
+        "with lazy models (lazy), with models loaded (eager) and of a worker "
+        "forked after preloading (fork)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode",
+            action="append",
+            choices=["lazy", "eager", "fork"],
+            help="Defaults to all modes.",
+        )
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--json", action="store_true")
+
+    def run(self, mode: str) -> dict:
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT, mode],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "audiotwitter.settings"},
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        results = []
+
+        for mode in options["mode"] or ["lazy", "eager", "fork"]:
+            runs = [self.run(mode) for _ in range(options["repeat"])]
+            result = {
+                "mode": mode,
+                "seconds": min(run["seconds"] for run in runs),
+                "peak_rss_mb": min(run["peak_rss_mb"] for run in runs),
+            }
+            if mode == "fork":
+                result["child"] = runs[-1]["child"]
+            results.append(result)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            line = (
+                f"{result['mode']:>6}: {result['seconds']:.2f}s, "
+                f"peak RSS {result['peak_rss_mb']:.0f} MB"
+            )
+            if "child" in result:
+                child = result["child"]
+                line += (
+                    f", forked child shares {child['shared_mb']:.0f} MB "
+                    f"and owns {child['private_mb']:.0f} MB"
+                )
+            self.stdout.write(line)
@@ -0,0 +1,234 @@
+import json
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.audio import SAMPLE_RATE, decode, duration
+from core.benchmarks import character_error_rate, peak_rss_mb, summarize
+from core.nouns import get_extractor
+from core.stt import STT
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / "fixtures" / "stt"
+
+STAGES = ["decode", "vad", "transcribe", "sentiment", "nouns"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the STT fixture corpus through each pipeline stage at several "
+        "concurrency levels and report real-time factor, per-stage latency, "
+        "throughput, accuracy and peak memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--manifest", default=str(FIXTURES_DIR / "manifest.json"))
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4])
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--compare",
+            help="Results of an earlier run to diff against. Exits with an error "
+            "when a metric regressed by more than --tolerance.",
+        )
+        parser.add_argument("--tolerance", type=float, default=0.1)
+
+    def synthesize(self, clip: Dict, directory: str) -> Path:
+        """A stand-in for a missing recording: one tone burst per word of the
+        transcript, with pauses between them, so decoding, VAD and the models
+        see audio of about the clip's length. It carries no speech, so it
+        counts toward the timings but not the accuracy."""
+        word = np.sin(
+            2 * np.pi * 220 * np.arange(int(0.35 * SAMPLE_RATE)) / SAMPLE_RATE
+        )
+        pause = np.zeros(int(0.15 * SAMPLE_RATE))
+        edge = np.zeros(int(0.5 * SAMPLE_RATE))
+        words = [
+            np.concatenate([0.3 * word, pause]) for _ in clip["transcript"].split()
+        ]
+        samples = np.concatenate([edge, *words, edge])
+
+        path = Path(directory) / clip["file"]
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with wave.open(str(path), "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes((samples * 32767).astype(np.int16).tobytes())
+        return path
+
+    def load_manifest(self, path: str, synthetic_dir: str) -> Dict:
+        manifest_path = Path(path)
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        # The recordings are not in the repository. Missing ones are replaced
+        # by synthetic clips and reported, so the command runs out of the box.
+        manifest["synthesized"] = []
+        for clip in manifest["clips"]:
+            clip["path"] = manifest_path.parent / clip["file"]
+            clip["synthetic"] = not clip["path"].exists()
+            if clip["synthetic"]:
+                clip["path"] = self.synthesize(clip, synthetic_dir)
+                manifest["synthesized"].append(clip["file"])
+                self.stderr.write(f"Missing fixture audio, synthesized: {clip['file']}")
+
+        return manifest
+
+    def run_clip(self, stt: STT, clip: Dict) -> Dict:
+        timings = {}
+
+        start = time.perf_counter()
+        audio = decode(clip["path"])
+        timings["decode"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chunks = stt.split(audio)
+        timings["vad"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        text = stt.transcribe_chunks(chunks)
+        timings["transcribe"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sentiment = stt.analyze_sentiment(text)
+        timings["sentiment"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stt.get_nouns(text)
+        timings["nouns"] = time.perf_counter() - start
+
+        if clip["synthetic"]:
+            return {"timings": timings, "audio_seconds": duration(audio)}
+
+        return {
+            "timings": timings,
+            "audio_seconds": duration(audio),
+            "cer": character_error_rate(clip["transcript"], text),
+            "sentiment_correct": sentiment == clip["sentiment"],
+        }
+
+    def measure(self, stt: STT, clips: List[Dict], concurrency: int) -> Dict:
+        # Every level starts cold, otherwise later levels would time cache hits.
+        get_extractor().cached.cache_clear()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            runs = list(executor.map(lambda clip: self.run_clip(stt, clip), clips))
+        elapsed = time.perf_counter() - start
+
+        audio_seconds = sum(run["audio_seconds"] for run in runs)
+        processing = sum(sum(run["timings"].values()) for run in runs)
+        recorded = [run for run in runs if "cer" in run]
+
+        return {
+            "concurrency": concurrency,
+            "stages": {
+                stage: summarize([run["timings"][stage] for run in runs])
+                for stage in STAGES
+            },
+            "rtf": processing / audio_seconds if audio_seconds else 0.0,
+            "clips_per_second": len(runs) / elapsed,
+            "audio_seconds_per_second": audio_seconds / elapsed,
+            "cer": (
+                sum(run["cer"] for run in recorded) / len(recorded)
+                if recorded
+                else None
+            ),
+            "sentiment_accuracy": (
+                sum(run["sentiment_correct"] for run in recorded) / len(recorded)
+                if recorded
+                else None
+            ),
+        }
+
+    def flatten(self, results: Dict) -> Dict[str, float]:
+        # Only costs, so an increase is always a regression.
+        metrics = {"peak_rss_mb": results["peak_rss_mb"]}
+        for level in results["levels"]:
+            prefix = f"x{level['concurrency']}"
+            metrics[f"{prefix}.rtf"] = level["rtf"]
+            if level["cer"] is not None:
+                metrics[f"{prefix}.cer"] = level["cer"]
+            for stage, summary in level["stages"].items():
+                metrics[f"{prefix}.{stage}.p50"] = summary["p50"]
+                metrics[f"{prefix}.{stage}.p95"] = summary["p95"]
+        return metrics
+
+    def compare(self, baseline: Dict, results: Dict, tolerance: float) -> List[str]:
+        if baseline["manifest_version"] != results["manifest_version"]:
+            self.stderr.write("Warning: the runs used different fixture versions")
+        if baseline.get("synthesized", []) != results["synthesized"]:
+            self.stderr.write("Warning: the runs synthesized different clips")
+
+        old, new = self.flatten(baseline), self.flatten(results)
+        regressions = []
+
+        for name in sorted(old.keys() & new.keys()):
+            before, after = old[name], new[name]
+            change = (after - before) / before if before else 0.0
+            self.stdout.write(
+                f"{name:<28} {before:10.4f} -> {after:10.4f}  {change:+.1%}"
+            )
+
+            if change > tolerance:
+                regressions.append(name)
+
+        return regressions
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as synthetic_dir:
+            manifest = self.load_manifest(options["manifest"], synthetic_dir)
+            results = self.benchmark(manifest, options)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+            regressions = self.compare(baseline, results, options["tolerance"])
+            if regressions:
+                raise CommandError(f"Regressed: {', '.join(regressions)}")
+
+    def benchmark(self, manifest: Dict, options: Dict) -> Dict:
+        clips = manifest["clips"] * options["repeat"]
+
+        stt = STT()
+        stt.preload()
+        stt.start_pool()
+        # Warm up outside the timings: first calls start pools and the JVM.
+        self.run_clip(stt, clips[0])
+
+        results = {
+            "manifest_version": manifest["version"],
+            "synthesized": manifest["synthesized"],
+            "engine": stt.model_version,
+            "chunk_workers": settings.STT_CHUNK_WORKERS,
+            "levels": [
+                self.measure(stt, clips, concurrency)
+                for concurrency in options["concurrency"]
+            ],
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+        for level in results["levels"]:
+            self.stdout.write(
+                f"x{level['concurrency']:<3} RTF {level['rtf']:.3f}  "
+                f"{level['audio_seconds_per_second']:7.1f} audio s/s  "
+                + (f"CER {level['cer']:.3f}  " if level["cer"] is not None else "")
+                + "  ".join(
+                    f"{stage} p50 {level['stages'][stage]['p50'] * 1000:.1f} ms"
+                    for stage in STAGES
+                )
+            )
+        self.stdout.write(f"peak RSS {results['peak_rss_mb']:.0f} MB")
+
+        return results
@@ -0,0 +1,120 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from babbles import babble_cache, timelines
+from babbles.models import Babble
+from core.benchmarks import summarize
+from followers.models import Follower
+from likes.models import Like
+from rebabbles.models import Rebabble
+from tags.models import Tag
+from users.models import User
+
+TAG = "viewerstatebenchmark"
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure every babble list endpoint for a viewer who liked and "
+        "rebabbled N babbles. Nothing is kept in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--likes", type=int, nargs="+", default=[0, 1000, 10000])
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--json", action="store_true")
+
+    def endpoints(self, viewer: User, author: User) -> dict:
+        return {
+            "home": "/babbles",
+            "explore": "/babbles/explore",
+            "profile": f"/babbles/{author.id}/profile",
+            "likes": f"/users/{viewer.id}/likes",
+            "rebabbles": f"/users/{viewer.id}/rebabbles",
+            "tag": f"/tags/{TAG}",
+        }
+
+    def prepare(self, likes: int):
+        viewer = User.objects.create_user(username="viewer-state-viewer")
+        author = User.objects.create_user(username="viewer-state-author")
+        Follower.objects.create(user=viewer, following=author)
+
+        babbles = Babble.objects.bulk_create(
+            Babble(user=author) for _ in range(max(likes, 20))
+        )
+        Like.objects.bulk_create(Like(user=viewer, babble=b) for b in babbles[:likes])
+        Rebabble.objects.bulk_create(
+            Rebabble(user=viewer, babble=b) for b in babbles[:likes]
+        )
+        tag = Tag.objects.create(text=TAG)
+        tag.babble_set.add(*babbles[-20:])
+
+        return viewer, author, [babble.id for babble in babbles]
+
+    def measure(self, client: APIClient, url: str, repeat: int) -> dict:
+        latencies = []
+        queries = 0
+
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                latencies.append(time.perf_counter() - start)
+            queries = len(context.captured_queries)
+
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} answered {response.status_code}")
+
+        return {**summarize(latencies), "queries": queries}
+
+    def run(self, likes: int, repeat: int) -> list:
+        results = []
+
+        try:
+            with transaction.atomic():
+                viewer, author, babble_ids = self.prepare(likes)
+                client = APIClient(SERVER_NAME="localhost")
+                client.force_authenticate(user=viewer)
+
+                try:
+                    for name, url in self.endpoints(viewer, author).items():
+                        result = self.measure(client, url, repeat)
+                        results.append({"endpoint": name, "likes": likes, **result})
+                finally:
+                    # The rolled back ids are reused, so nothing cached for
+                    # them may outlive the run.
+                    timelines.delete(viewer.id)
+                    timelines.get_connection().delete(timelines.outbox_key(author.id))
+                    babble_cache.delete_many(babble_ids)
+
+                raise Rollback
+        except Rollback:
+            pass
+
+        return results
+
+    def handle(self, *args, **options):
+        results = []
+        for likes in options["likes"]:
+            results += self.run(likes, options["repeat"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for result in results:
+            self.stdout.write(
+                f"{result['endpoint']:>10} {result['likes']:>7} likes  "
+                f"p50 {result['p50'] * 1000:7.1f} ms  "
+                f"p95 {result['p95'] * 1000:7.1f} ms  "
+                f"{result['queries']:>3} queries"
+            )
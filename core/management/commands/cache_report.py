@@ -0,0 +1,94 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from core.cachestats import memory_by_keyspace, read_stats
+
+ALIASES = ("default", "second")
+
+
+class Command(BaseCommand):
+    help = (
+        "Report memory and hit ratio per cache keyspace, and the Redis "
+        "memory cap and eviction policy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=100,
+            help="Keys per keyspace measured with MEMORY USAGE.",
+        )
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Set CACHE_MAXMEMORY and CACHE_EVICTION_POLICY on the servers.",
+        )
+        parser.add_argument("--json", action="store_true")
+
+    def servers(self, connections: dict) -> dict:
+        servers = {}
+        for connection in connections.values():
+            kwargs = connection.connection_pool.connection_kwargs
+            address = f"{kwargs.get('host')}:{kwargs.get('port')}"
+            servers.setdefault(address, connection)
+        return servers
+
+    def server_info(self, connection) -> dict:
+        info = {**connection.info("memory"), **connection.info("stats")}
+        return {
+            "used_memory": info["used_memory"],
+            "maxmemory": info["maxmemory"],
+            "maxmemory_policy": info["maxmemory_policy"],
+            "evicted_keys": info["evicted_keys"],
+        }
+
+    def handle(self, *args, **options):
+        connections = {alias: get_redis_connection(alias) for alias in ALIASES}
+        servers = self.servers(connections)
+
+        if options["apply"]:
+            for connection in servers.values():
+                connection.config_set("maxmemory", settings.CACHE_MAXMEMORY)
+                connection.config_set(
+                    "maxmemory-policy", settings.CACHE_EVICTION_POLICY
+                )
+
+        hit_ratios = read_stats(list(connections.values()))
+        report = {
+            "servers": {
+                address: self.server_info(connection)
+                for address, connection in servers.items()
+            },
+            "keyspaces": {},
+        }
+        for alias, connection in connections.items():
+            for keyspace, memory in memory_by_keyspace(
+                connection, options["sample"]
+            ).items():
+                report["keyspaces"][f"{alias}/{keyspace}"] = {
+                    **memory,
+                    **hit_ratios.get(keyspace, {}),
+                }
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for address, server in report["servers"].items():
+            self.stdout.write(
+                f"{address}  used {server['used_memory'] / 2**20:.1f} MB  "
+                f"max {server['maxmemory'] / 2**20:.1f} MB  "
+                f"{server['maxmemory_policy']}  "
+                f"evicted {server['evicted_keys']}"
+            )
+        for name, keyspace in sorted(report["keyspaces"].items()):
+            hit_ratio = keyspace.get("hit_ratio")
+            self.stdout.write(
+                f"{name:>20} {keyspace['keys']:>9} keys  "
+                f"{keyspace['bytes'] / 2**20:9.2f} MB  "
+                + (f"hit ratio {hit_ratio:.1%}" if hit_ratio is not None else "")
+            )
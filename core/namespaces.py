@@ -0,0 +1,11 @@
+from django.conf import settings
+
+
+def namespace(keyspace: str) -> str:
+    """The prefix of a keyspace's keys, e.g. "timeline:v1".
+
+    Bump the keyspace's version in CACHE_VERSIONS when the format of its
+    values changes incompatibly. New keys are then written beside the old
+    ones, which are no longer read and expire on their own.
+    """
+    return f"{keyspace}:v{settings.CACHE_VERSIONS[keyspace]}"
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import queue
+import re
+import threading
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class NounExtractor:
+    """Korean noun extraction with an LRU cache in front of the tokenizer."""
+
+    name = "base"
+
+    def __init__(self, cache_size: int = 4096) -> None:
+        self.cached = lru_cache(maxsize=cache_size)(self.extract_tuple)
+
+    def extract(self, text: str) -> List[str]:
+        raise NotImplementedError
+
+    def extract_tuple(self, text: str) -> Tuple[str, ...]:
+        return tuple(self.extract(text))
+
+    def nouns(self, text: str) -> List[str]:
+        return list(self.cached(text))
+
+
+class OktExtractor(NounExtractor):
+    """KoNLPy Okt behind a pool, one instance per concurrent caller.
+
+    Okt runs in a JVM through JPype. A JVM does not survive fork and can not
+    be started a second time in the child, so it must first be used after
+    the worker processes are forked; a forked copy of an extractor that
+    already started it raises instead of hanging.
+    """
+
+    name = "okt"
+
+    def __init__(self, pool_size: int = 4, **options: Any) -> None:
+        super().__init__(**options)
+        self.pool_size = pool_size
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.pool: "queue.Queue" = queue.Queue()
+        self.created = 0
+
+    def acquire(self) -> Any:
+        with self.lock:
+            if self.pid is None:
+                self.pid = os.getpid()
+            elif self.pid != os.getpid():
+                raise RuntimeError(
+                    "Okt's JVM was started before this process was forked"
+                )
+
+            if self.pool.empty() and self.created < self.pool_size:
+                from konlpy.tag import Okt
+
+                self.created += 1
+                return Okt()
+
+        return self.pool.get()
+
+    def extract(self, text: str) -> List[str]:
+        okt = self.acquire()
+        try:
+            return okt.nouns(text)
+        finally:
+            self.pool.put(okt)
+
+
+class MecabExtractor(NounExtractor):
+    """KoNLPy Mecab: a C++ tokenizer, so no JVM. Needs mecab-ko installed."""
+
+    name = "mecab"
+
+    def __init__(self, **options: Any) -> None:
+        super().__init__(**options)
+        self.local = threading.local()
+
+    def extract(self, text: str) -> List[str]:
+        if not hasattr(self.local, "mecab"):
+            from konlpy.tag import Mecab
+
+            self.local.mecab = Mecab()
+        return self.local.mecab.nouns(text)
+
+
+# Longest first, so "으로" is stripped whole rather than just "로".
+PARTICLES = sorted(
+    (
+        "에서부터 으로부터 에게서 한테서 이라고 이랑 에서 에게 한테 으로 부터 까지 "
+        "처럼 보다 하고 마저 조차 밖에 라고 은 는 이 가 을 를 에 의 도 만 로 와 과 랑"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+PREDICATE_ENDINGS = tuple(
+    "다 요 서 고 며 면 니 까 데 지만 게 죠 네 어 아 았 었 는 던 은 을 한 긴".split()
+)
+# Frequent adverbs and determiners that a word list can not tell from nouns.
+STOPWORDS = frozenset("이 그 저 안 못 너무 정말 많이 새로 계속 갑자기 조금씩".split())
+HANGUL_WORD = re.compile(r"[가-힣]+")
+
+
+class SimpleExtractor(NounExtractor):
+    """Pure Python approximation: strip particles and drop predicates.
+
+    A lossy fallback, never chosen automatically: it does not tag the same
+    nouns as Okt, only similar ones, and can keep adverbs and verb forms
+    that Okt drops. It is much faster and needs no native code. Measure how
+    often its tags agree with Okt on your own sentences with
+    ``benchmark_nouns`` before selecting it in STT_NOUNS.
+    """
+
+    name = "simple"
+
+    def extract(self, text: str) -> List[str]:
+        nouns = []
+        for word in HANGUL_WORD.findall(text):
+            for particle in PARTICLES:
+                if word.endswith(particle) and len(word) > len(particle):
+                    word = word[: -len(particle)]
+                    break
+            else:
+                if word.endswith(PREDICATE_ENDINGS):
+                    continue
+
+            if word.endswith("들") and len(word) > 2:
+                word = word[:-1]
+            if word not in STOPWORDS:
+                nouns.append(word)
+
+        return nouns
+
+
+_extractor: Optional[NounExtractor] = None
+_extractor_lock = threading.Lock()
+
+
+def build_extractor(backend: str) -> NounExtractor:
+    config = settings.STT_NOUNS
+    extractor_class = import_string(backend)
+    return extractor_class(cache_size=config["CACHE_SIZE"], **config.get("OPTIONS", {}))
+
+
+def get_extractor() -> NounExtractor:
+    global _extractor
+
+    with _extractor_lock:
+        if _extractor is None:
+            _extractor = build_extractor(settings.STT_NOUNS["BACKEND"])
+        return _extractor
@@ -0,0 +1,41 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from rest_framework.exceptions import ValidationError
+
+# A position in a feed: (creation time as a POSIX timestamp, babble id).
+# The timestamp is also the babble's score in the Redis timelines.
+Position = Tuple[float, int]
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def position_of(created: datetime, id: int) -> Position:
+    return (created.timestamp(), id)
+
+
+def created_of(position: Position) -> datetime:
+    return EPOCH + timedelta(microseconds=round(position[0] * 10**6))
+
+
+def encode_cursor(position: Optional[Position]) -> Optional[str]:
+    if position is None:
+        return None
+
+    # Whole microseconds, so the cursor survives the trip through a string.
+    raw = f"{round(position[0] * 10**6)}:{position[1]}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Position]:
+    if not cursor:
+        return None
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        microseconds, id = (int(part) for part in raw.split(":"))
+    except ValueError:
+        raise ValidationError({"next": "Invalid cursor."})
+
+    return (microseconds / 10**6, id)
@@ -0,0 +1,214 @@
+import json
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+
+class BaseQueue:
+    """A priority queue of JSON jobs.
+
+    ``pop`` leases a job instead of removing it: the job stays in the queue,
+    hidden, until the worker calls ``ack``. Jobs of workers that died before
+    acking are handed back by ``reap`` once their lease runs out.
+    """
+
+    errors: tuple = ()
+
+    def __init__(self, location: Any, name: str = "stt", lease: float = 600) -> None:
+        self.location = location
+        self.name = name
+        self.lease = lease
+
+    def push(self, payload: Dict, score: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    def pop(self, timeout: float = 1.0) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def ack(self, payload: Dict) -> None:
+        raise NotImplementedError
+
+    def reap(self) -> List[Dict]:
+        """Remove and return the jobs whose lease has expired."""
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+
+class SQLiteQueue(BaseQueue):
+    errors = (sqlite3.Error,)
+    poll_interval = 0.2
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.location), timeout=10, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "queue TEXT NOT NULL, "
+            "score REAL NOT NULL, "
+            "payload TEXT NOT NULL, "
+            "leased_until REAL)"
+        )
+        # Queue files created before jobs were leased lack the column.
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+        if "leased_until" not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN leased_until REAL")
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_pending "
+            "ON jobs (queue, leased_until, score, id)"
+        )
+        return conn
+
+    def push(self, payload: Dict, score: Optional[float] = None) -> None:
+        score = time.time() if score is None else score
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (queue, score, payload) VALUES (?, ?, ?)",
+                (self.name, score, json.dumps(payload)),
+            )
+
+    def pop(self, timeout: float = 1.0) -> Optional[Dict]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            payload = self.pop_nowait()
+            if payload is not None or time.monotonic() >= deadline:
+                return payload
+            time.sleep(self.poll_interval)
+
+    def pop_nowait(self) -> Optional[Dict]:
+        conn = self.connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front so two workers
+            # can never select the same row.
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload FROM jobs "
+                "WHERE queue = ? AND leased_until IS NULL "
+                "ORDER BY score, id LIMIT 1",
+                (self.name,),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET leased_until = ? WHERE id = ?",
+                (time.time() + self.lease, row[0]),
+            )
+            conn.execute("COMMIT")
+            return json.loads(row[1])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def ack(self, payload: Dict) -> None:
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE id = ("
+                "SELECT id FROM jobs WHERE queue = ? AND payload = ? "
+                "AND leased_until IS NOT NULL LIMIT 1)",
+                (self.name, json.dumps(payload)),
+            )
+
+    def reap(self) -> List[Dict]:
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, payload FROM jobs WHERE queue = ? AND leased_until < ?",
+                (self.name, time.time()),
+            ).fetchall()
+            conn.executemany("DELETE FROM jobs WHERE id = ?", [(id,) for id, _ in rows])
+            conn.execute("COMMIT")
+            return [json.loads(payload) for _, payload in rows]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def size(self) -> int:
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE queue = ? AND leased_until IS NULL",
+                (self.name,),
+            ).fetchone()
+        return row[0]
+
+
+# Moves the first job to the leased set in one step, so a worker that dies
+# right after popping cannot lose it.
+LEASE_SCRIPT = """
+local item = redis.call("ZPOPMIN", KEYS[1])
+if #item == 0 then
+    return nil
+end
+redis.call("ZADD", KEYS[2], ARGV[1], item[1])
+return item[1]
+"""
+
+
+class RedisQueue(BaseQueue):
+    errors = (RedisError,)
+    poll_interval = 0.2
+
+    @property
+    def key(self) -> str:
+        return f"queue:{self.name}"
+
+    @property
+    def leased_key(self) -> str:
+        return f"queue:{self.name}:leased"
+
+    @property
+    def redis(self) -> Any:
+        return get_redis_connection(self.location)
+
+    def push(self, payload: Dict, score: Optional[float] = None) -> None:
+        score = time.time() if score is None else score
+        self.redis.zadd(self.key, {json.dumps(payload): score})
+
+    def pop(self, timeout: float = 1.0) -> Optional[Dict]:
+        deadline = time.monotonic() + timeout
+        lease = self.redis.register_script(LEASE_SCRIPT)
+
+        while True:
+            item = lease(
+                keys=[self.key, self.leased_key], args=[time.time() + self.lease]
+            )
+            if item is not None:
+                return json.loads(item)
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.poll_interval)
+
+    def ack(self, payload: Dict) -> None:
+        self.redis.zrem(self.leased_key, json.dumps(payload))
+
+    def reap(self) -> List[Dict]:
+        redis = self.redis
+        jobs = []
+        for item in redis.zrangebyscore(self.leased_key, "-inf", time.time()):
+            # Only the reaper whose ZREM removed the job hands it back.
+            if redis.zrem(self.leased_key, item):
+                jobs.append(json.loads(item))
+        return jobs
+
+    def size(self) -> int:
+        return self.redis.zcard(self.key)
+
+
+def get_queue(name: str = "stt") -> BaseQueue:
+    config = settings.STT_QUEUE
+    queue_class = import_string(config["BACKEND"])
+    return queue_class(config["LOCATION"], name=name, lease=settings.STT_JOB_LEASE)
@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+
+class SchedulerFull(Exception):
+    pass
+
+
+class SchedulerTimeout(Exception):
+    pass
+
+
+class Scheduler:
+    """Admission control for model inference.
+
+    At most ``limit`` callers run at once, at most ``max_waiting`` callers
+    wait for a slot, and nobody waits longer than ``timeout`` seconds. Pass
+    a ``multiprocessing.BoundedSemaphore`` created before forking to share
+    the limit between worker processes.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_waiting: int,
+        timeout: float,
+        semaphore: Optional[Any] = None,
+    ) -> None:
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.semaphore = semaphore or threading.BoundedSemaphore(limit)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        waited = 0.0
+        acquired = self.semaphore.acquire(False)
+
+        if not acquired:
+            with self.lock:
+                if self.waiting >= self.max_waiting:
+                    self.rejected += 1
+                    raise SchedulerFull
+                self.waiting += 1
+
+            start = time.monotonic()
+            acquired = self.semaphore.acquire(timeout=self.timeout)
+            waited = time.monotonic() - start
+
+            with self.lock:
+                self.waiting -= 1
+                if not acquired:
+                    self.rejected += 1
+                    raise SchedulerTimeout
+
+        with self.lock:
+            self.running += 1
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.running -= 1
+            self.semaphore.release()
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "running": self.running,
+                "waiting": self.waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "avg_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+                "max_wait": self.max_wait,
+            }
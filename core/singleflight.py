@@ -0,0 +1,77 @@
+import math
+import random
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+# Deletes the lock only if it still holds our token, so a caller whose lock
+# timed out does not release the next holder's lock.
+RELEASE_SCRIPT = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+
+def lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+
+def acquire(connection: Any, key: str, timeout: float) -> Optional[str]:
+    """A token if the rebuild lock for ``key`` was free, else None. The lock
+    frees itself after ``timeout`` seconds if its holder dies."""
+    token = uuid.uuid4().hex
+    if connection.set(lock_key(key), token, nx=True, px=int(timeout * 1000)):
+        return token
+    return None
+
+
+def release(connection: Any, key: str, token: str) -> None:
+    connection.register_script(RELEASE_SCRIPT)(keys=[lock_key(key)], args=[token])
+
+
+def wait_for(
+    read: Callable[[], Optional[Any]], wait: float, interval: float = 0.02
+) -> Optional[Any]:
+    """Poll ``read`` until it returns something or ``wait`` seconds pass."""
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        value = read()
+        if value is not None:
+            return value
+    return None
+
+
+def single_flight(
+    connection: Any,
+    key: str,
+    rebuild: Callable[[], Any],
+    read: Callable[[], Optional[Any]],
+    timeout: float,
+    wait: float,
+) -> Any:
+    """Run ``rebuild`` in one caller per ``key`` at a time. The others poll
+    ``read`` for up to ``wait`` seconds and rebuild themselves if the holder
+    has not finished by then."""
+    token = acquire(connection, key, timeout)
+    if token is None:
+        value = wait_for(read, wait)
+        if value is not None:
+            return value
+        return rebuild()
+
+    try:
+        return rebuild()
+    finally:
+        release(connection, key, token)
+
+
+def refresh_early(ttl: float, delta: float, beta: float = 1.0) -> bool:
+    """Probabilistic early expiration ("XFetch"): True more and more often
+    as the ``ttl`` seconds left approach what a rebuild costs (``delta``
+    seconds), so one caller usually refreshes an entry before it expires."""
+    if ttl < 0 or delta <= 0:
+        return False
+    return -delta * beta * math.log(1.0 - random.random()) >= ttl
@@ -1,56 +1,192 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
+import threading
 from collections import Counter
-from typing import List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-import whisper
-from konlpy.tag import Okt
-from transformers import ElectraForSequenceClassification, ElectraTokenizer, pipeline
+from django.conf import settings
+from django.core.cache import caches
+
+from core.audio import SAMPLE_RATE, closed_length, decode, duration, split_chunks
+from core.batching import MicroBatcher
+from core.engines import Engine, get_engine
+from core.scheduler import Scheduler
+from core.utils import file_hash
+
+# Bump when the shape of the cached analysis result changes.
+RESULT_VERSION = 2
 
 
 class STT:
-    def __init__(self) -> None:
-        self.whisper_model = whisper.load_model("small", device="cpu")
-        self.tokenizer = ElectraTokenizer.from_pretrained(
-            "monologg/koelectra-base-finetuned-nsmc"
+    def __init__(self, engine: Optional[Engine] = None) -> None:
+        self.engine = engine or get_engine()
+        self.scheduler = Scheduler(
+            limit=settings.STT_CONCURRENCY,
+            max_waiting=settings.STT_MAX_WAITING,
+            timeout=settings.STT_WAIT_TIMEOUT,
         )
-        self.electra_model = ElectraForSequenceClassification.from_pretrained(
-            "monologg/koelectra-base-finetuned-nsmc"
+        self.cache = caches["stt"]
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.classifier = MicroBatcher(
+            self.engine.classify_batch,
+            max_size=settings.STT_SENTIMENT_BATCH["MAX_SIZE"],
+            max_wait=settings.STT_SENTIMENT_BATCH["MAX_WAIT_MS"] / 1000,
         )
-        self.analyzer = pipeline(
-            "sentiment-analysis", tokenizer=self.tokenizer, model=self.electra_model
+
+    @property
+    def model_version(self) -> str:
+        return self.engine.version
+
+    def preload(self) -> None:
+        self.engine.load()
+
+    @property
+    def vad_options(self) -> Dict:
+        return {
+            "threshold_db": settings.STT_VAD["THRESHOLD_DB"],
+            "min_silence_ms": settings.STT_VAD["MIN_SILENCE_MS"],
+            "padding_ms": settings.STT_VAD["PADDING_MS"],
+        }
+
+    def split(self, audio: Any) -> List[Any]:
+        return split_chunks(
+            audio, max_seconds=settings.STT_CHUNK_SECONDS, **self.vad_options
         )
-        self.okt = Okt()
-        self.gpu_count = 0
 
-    def transcribe(self, audio_path: str) -> str:
-        result = self.whisper_model.transcribe(audio_path, fp16=False)
-        return result["text"]
+    def transcribe_closed(self, audio_path: str, offset: float) -> Tuple[str, float]:
+        """Transcribe the speech after ``offset`` seconds that is already
+        followed by a pause, for files that are still growing.
+
+        Returns the text and the offset up to which the file is transcribed.
+        """
+        # Only what arrived since the last pass is decoded, so each chunk of
+        # an upload costs about its own length rather than the whole file's.
+        audio = decode(audio_path, start=offset)
+        end = closed_length(audio, **self.vad_options)
+        if end == 0:
+            return "", offset
+
+        with self.scheduler.slot():
+            text = self.transcribe_chunks(self.split(audio[:end]))
+
+        return text, offset + duration(audio[:end])
+
+    def transcribe(self, audio: Any) -> str:
+        return self.engine.transcribe(audio).strip()
+
+    def start_pool(self) -> None:
+        """Start the processes that transcribe the chunks of long babbles.
+
+        Call it while the process still has a single thread: a child forked
+        later could inherit a lock, such as the one get_stt takes, held by
+        another thread and wait on it forever. The children share whatever
+        models are loaded at this point (see STT_PRELOAD) and load the rest
+        themselves before taking work. Without a pool, chunks are
+        transcribed one after another in the calling thread.
+        """
+        if self.pool is not None or settings.STT_CHUNK_WORKERS <= 1:
+            return
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=settings.STT_CHUNK_WORKERS,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=load_chunk_worker,
+        )
+        # The fork context starts every child on the first submit.
+        self.pool.submit(int).result()
+
+    def transcribe_chunks(self, chunks: List[Any]) -> str:
+        if len(chunks) > 1 and self.pool is not None:
+            texts = self.pool.map(transcribe_chunk, chunks)
+        else:
+            texts = map(self.transcribe, chunks)
+
+        return " ".join(text for text in texts if text)
 
     def analyze_sentiment(self, text: str) -> str:
-        if self.analyzer(text)[0]["label"] == "positive":
+        if self.classifier(text) == "positive":
             return "긍정"
         else:
             return "부정"
 
-    def check_can_run(self) -> None:
-        while True:
-            if self.gpu_count >= 8:
-                continue
-            return
-
     def get_nouns(self, text) -> List[str]:
-        nouns = [x for x in self.okt.nouns(text) if len(x) > 1]
+        nouns = [x for x in self.engine.nouns(text) if len(x) > 1]
         nouns = Counter(nouns).most_common(6)
         return [x[0] for x in nouns]
 
-    def get_keywords(self, audio_path: str) -> List[str]:
-        self.check_can_run()
+    def analyze(
+        self,
+        audio_path: str,
+        transcript: str = "",
+        offset: float = 0.0,
+        audio: Optional[Any] = None,
+    ) -> Dict:
+        """``transcript`` is the text of the first ``offset`` seconds, when
+        those were transcribed while the file was still uploading. ``audio``
+        is the file's already decoded samples, if the caller has them."""
+        audio_hash = file_hash(audio_path)
+        key = f"{self.model_version}:{audio_hash}"
+        result = self.cache.get(key, version=RESULT_VERSION)
+        if result is not None:
+            return result
+
+        # Decode once and hand the model only the speech, so the cost follows
+        # what was said rather than the length of the file.
+        if audio is None:
+            audio = decode(audio_path)
+        start = int(offset * SAMPLE_RATE)
+        chunks = self.split(audio[start:])
+        # The prefix was transcribed during the upload; it is only split
+        # again to count its speech.
+        speech = self.split(audio[:start]) + chunks if start else chunks
+
+        with self.scheduler.slot():
+            parts = (transcript, self.transcribe_chunks(chunks))
+            text = " ".join(part for part in parts if part)
+
+        # Outside the slot: the batcher admits sentiment requests itself, and
+        # only jobs that are not holding one of the few slots can fill a batch.
+        sentiment = self.analyze_sentiment(text)
+
+        result = {
+            "text": text,
+            "sentiment": sentiment,
+            "nouns": self.get_nouns(text),
+            "duration": duration(audio),
+            "speech_duration": sum(duration(chunk) for chunk in speech),
+            "audio_hash": audio_hash,
+            "version": self.model_version,
+        }
+        self.cache.set(key, result, version=RESULT_VERSION)
+
+        return result
+
+    def get_keywords(self, audio_path: str, audio: Optional[Any] = None) -> List[str]:
+        return keywords_from(self.analyze(audio_path, audio=audio))
+
+
+def keywords_from(result: Dict) -> List[str]:
+    return [result["sentiment"]] + result["nouns"]
+
+
+_stt: Optional[STT] = None
+_stt_lock = threading.Lock()
+
+
+def get_stt() -> STT:
+    global _stt
+
+    with _stt_lock:
+        if _stt is None:
+            _stt = STT()
+        return _stt
+
 
-        self.gpu_count += 1
-        text = self.transcribe(audio_path)
-        keywords = [self.analyze_sentiment(text)]
-        self.gpu_count -= 1
+def load_chunk_worker() -> None:
+    # Runs once in each pool process, which has its own STT instance.
+    get_stt().preload()
 
-        keywords += self.get_nouns(text)
 
-        return keywords
+def transcribe_chunk(chunk: Any) -> str:
+    return get_stt().transcribe(chunk)
@@ -1,7 +1,40 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+from django_redis import get_redis_connection
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
+from babbles.models import Babble
+from core.audio import (
+    SAMPLE_RATE,
+    closed_length,
+    duration,
+    speech_segments,
+    split_chunks,
+    trim_silence,
+)
+from core.batching import MicroBatcher
+from core.benchmarks import character_error_rate
+from core.cachestats import STATS_KEY, KeyspaceStats, keyspace_of, read_stats
+from core.engines import Engine, FakeEngine, FasterWhisperEngine
+from core.localcache import LocalCache
+from core.nouns import SimpleExtractor
+from core.queues import SQLiteQueue
+from core.scheduler import Scheduler, SchedulerFull, SchedulerTimeout
+from core.singleflight import refresh_early, single_flight
+from core.stt import STT, get_stt
+from core.utils import file_hash
+from core.viewer import check_viewer_state
+from likes.models import Like
+from rebabbles.models import Rebabble
 from users.models import User
 
 
@@ -39,3 +72,392 @@ class AuthViewSetTestCase(APITestCase):
         }
         response = self.client.post(reverse("auth-signin"), signin_data)
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SQLiteQueueTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.queue = SQLiteQueue(os.path.join(self.tmp_dir.name, "queue.sqlite3"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pop_in_score_order(self):
+        self.queue.push({"babble_id": 2}, score=2)
+        self.queue.push({"babble_id": 1}, score=1)
+
+        self.assertEqual(self.queue.size(), 2)
+        self.assertEqual(self.queue.pop(timeout=0), {"babble_id": 1})
+        self.assertEqual(self.queue.pop(timeout=0), {"babble_id": 2})
+
+    def test_pop_empty(self):
+        self.assertIsNone(self.queue.pop(timeout=0))
+
+    def test_unacked_job_is_reaped_after_lease(self):
+        self.queue.lease = 0
+        self.queue.push({"babble_id": 1})
+        self.queue.push({"babble_id": 2})
+
+        self.assertEqual(self.queue.pop(timeout=0), {"babble_id": 1})
+        self.assertEqual(self.queue.pop(timeout=0), {"babble_id": 2})
+        self.queue.ack({"babble_id": 2})
+
+        self.assertEqual(self.queue.size(), 0)
+        self.assertEqual(self.queue.reap(), [{"babble_id": 1}])
+        self.assertEqual(self.queue.reap(), [])
+
+
+class SchedulerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def hold_slot(self, scheduler):
+        with scheduler.slot():
+            self.entered.set()
+            self.release.wait()
+
+    def occupy(self, scheduler):
+        thread = threading.Thread(target=self.hold_slot, args=(scheduler,))
+        thread.start()
+        self.entered.wait()
+        return thread
+
+    def test_rejects_when_wait_queue_is_full(self):
+        scheduler = Scheduler(limit=1, max_waiting=0, timeout=1)
+        thread = self.occupy(scheduler)
+
+        with self.assertRaises(SchedulerFull):
+            with scheduler.slot():
+                pass
+
+        self.release.set()
+        thread.join()
+        self.assertEqual(scheduler.stats()["rejected"], 1)
+
+    def test_times_out_waiting_for_slot(self):
+        scheduler = Scheduler(limit=1, max_waiting=1, timeout=0.05)
+        thread = self.occupy(scheduler)
+
+        with self.assertRaises(SchedulerTimeout):
+            with scheduler.slot():
+                pass
+
+        self.release.set()
+        thread.join()
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+
+class FileHashTestCase(SimpleTestCase):
+    def test_same_content_same_hash(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = [os.path.join(tmp_dir, name) for name in ("a.mp3", "b.mp3")]
+            for path in paths:
+                with open(path, "wb") as f:
+                    f.write(b"babble")
+
+            self.assertEqual(file_hash(paths[0]), file_hash(paths[1]))
+
+
+# Tests never need real models; the fake engine answers instantly.
+@override_settings(
+    STT_ENGINE={"BACKEND": "core.engines.FakeEngine"},
+    CACHES={
+        **settings.CACHES,
+        "stt": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+)
+class STTTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = os.path.join(self.tmp_dir.name, "babble.mp3")
+        with open(self.audio_path, "wb") as f:
+            f.write(b"babble")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_provider_returns_shared_instance(self):
+        self.assertIs(get_stt(), get_stt())
+
+    def test_models_load_once_on_first_use(self):
+        engine = Engine()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            return object()
+
+        self.assertEqual(engine.models, {})
+        self.assertIs(
+            engine.load_model("model", loader), engine.load_model("model", loader)
+        )
+        self.assertEqual(len(calls), 1)
+
+    def test_faster_whisper_quantize_transcribes_in_int8(self):
+        engine = FasterWhisperEngine(compute_type="float32", quantize=True)
+        self.assertEqual(engine.compute_type, "int8")
+        self.assertEqual(
+            FasterWhisperEngine(compute_type="float32").compute_type, "float32"
+        )
+
+    @override_settings(STT_CHUNK_WORKERS=2)
+    def test_chunks_are_transcribed_on_the_pool(self):
+        stt = STT()
+        stt.start_pool()
+        self.addCleanup(stt.pool.shutdown)
+
+        text = stt.engine.transcript
+        self.assertEqual(stt.transcribe_chunks([None, None]), f"{text} {text}")
+
+    @override_settings(
+        STT_CONCURRENCY=1, STT_SENTIMENT_BATCH={"MAX_SIZE": 4, "MAX_WAIT_MS": 1000}
+    )
+    def test_sentiment_batches_exceed_concurrency(self):
+        stt = STT(FakeEngine())
+        paths = []
+        for i in range(4):
+            paths.append(os.path.join(self.tmp_dir.name, f"babble{i}.mp3"))
+            with open(paths[-1], "wb") as f:
+                f.write(f"babble{i}".encode())
+        audio = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda path: stt.analyze(path, audio=audio), paths))
+
+        self.assertEqual(stt.classifier.batches, 1)
+        self.assertEqual(stt.classifier.items, 4)
+
+    def test_speech_duration_counts_the_uploaded_prefix(self):
+        stt = STT(FakeEngine())
+        seconds = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        tone = (0.5 * np.sin(2 * np.pi * 220 * seconds)).astype(np.float32)
+        silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+        audio = np.concatenate([tone, silence, tone])
+
+        result = stt.analyze(self.audio_path, "안녕", offset=1.5, audio=audio)
+
+        whole = sum(duration(chunk) for chunk in stt.split(audio))
+        self.assertAlmostEqual(result["speech_duration"], whole, delta=0.1)
+
+    def test_get_keywords_with_fake_engine(self):
+        stt = STT(FakeEngine(transcript="오늘 날씨 오늘 공원", label="negative"))
+        # Decoded samples are passed in, so no ffmpeg is needed.
+        seconds = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        tone = (0.5 * np.sin(2 * np.pi * 220 * seconds)).astype(np.float32)
+
+        self.assertEqual(
+            stt.get_keywords(self.audio_path, audio=tone),
+            ["부정", "오늘", "날씨", "공원"],
+        )
+
+
+class AudioTestCase(SimpleTestCase):
+    def setUp(self):
+        seconds = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        self.tone = (0.5 * np.sin(2 * np.pi * 220 * seconds)).astype(np.float32)
+        self.silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+
+    def test_trims_leading_trailing_and_long_pauses(self):
+        audio = np.concatenate(
+            [self.silence, self.tone, self.silence, self.silence, self.tone]
+        )
+
+        speech = trim_silence(audio, padding_ms=100)
+
+        self.assertEqual(len(speech_segments(audio, padding_ms=100)), 2)
+        self.assertAlmostEqual(duration(speech), 2.2, delta=0.2)
+
+    def test_keeps_short_pauses(self):
+        audio = np.concatenate([self.tone, self.silence[: SAMPLE_RATE // 4], self.tone])
+        self.assertEqual(len(speech_segments(audio)), 1)
+
+    def test_closed_length_stops_before_open_speech(self):
+        audio = np.concatenate([self.tone, self.silence, self.tone])
+        first_end = speech_segments(audio)[0][1]
+
+        self.assertEqual(closed_length(audio), first_end)
+        self.assertEqual(closed_length(self.tone), 0)
+        self.assertEqual(
+            closed_length(np.concatenate([audio, self.silence])),
+            len(audio) + SAMPLE_RATE // 5,
+        )
+
+    def test_silence_only(self):
+        self.assertEqual(len(trim_silence(self.silence)), 0)
+
+    def test_split_chunks_at_silences(self):
+        audio = np.concatenate([self.tone, self.silence] * 4)
+
+        chunks = split_chunks(audio, max_seconds=3)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(all(duration(chunk) <= 3 for chunk in chunks))
+        np.testing.assert_array_equal(np.concatenate(chunks), trim_silence(audio))
+
+    def test_split_long_segment(self):
+        audio = np.concatenate([self.tone] * 3)
+        chunks = split_chunks(audio, max_seconds=1)
+        self.assertEqual([duration(chunk) for chunk in chunks], [1.0, 1.0, 1.0])
+
+
+class MicroBatcherTestCase(SimpleTestCase):
+    def test_batches_concurrent_calls(self):
+        batch_sizes = []
+
+        def double(items):
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(double, max_size=8, max_wait=0.05)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(batcher, range(8)))
+
+        self.assertEqual(results, [item * 2 for item in range(8)])
+        self.assertLess(len(batch_sizes), 8)
+
+    def test_errors_reach_every_caller(self):
+        def fail(items):
+            raise ValueError
+
+        batcher = MicroBatcher(fail, max_size=4, max_wait=0.01)
+        with self.assertRaises(ValueError):
+            batcher(1)
+
+
+class NounExtractorTestCase(SimpleTestCase):
+    def test_simple_strips_particles(self):
+        extractor = SimpleExtractor()
+        nouns = extractor.nouns("오늘 날씨가 정말 좋아서 친구들이랑 공원에 갔다")
+        self.assertEqual(nouns, ["오늘", "날씨", "친구", "공원"])
+
+    def test_repeated_text_is_cached(self):
+        extractor = SimpleExtractor()
+        first = extractor.nouns("공원에 산책을 갔다")
+        first.append("changed")
+        second = extractor.nouns("공원에 산책을 갔다")
+
+        self.assertEqual(second, ["공원", "산책"])
+        self.assertEqual(extractor.cached.cache_info().hits, 1)
+
+
+class CharacterErrorRateTestCase(SimpleTestCase):
+    def test_ignores_spaces(self):
+        self.assertEqual(character_error_rate("오늘 날씨", "오늘날씨"), 0.0)
+
+    def test_counts_edits(self):
+        self.assertEqual(character_error_rate("공원산책", "공원 산적"), 0.25)
+        self.assertEqual(character_error_rate("공원", ""), 1.0)
+
+
+class ViewerStateTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="viewer", password="viewer")
+        self.babbles = Babble.objects.bulk_create(
+            Babble(user=self.user) for _ in range(4)
+        )
+        Like.objects.create(user=self.user, babble=self.babbles[0])
+        Like.objects.create(user=self.user, babble=self.babbles[3])
+        Rebabble.objects.create(user=self.user, babble=self.babbles[1])
+
+    def test_check_viewer_state(self):
+        page = [{"id": babble.id} for babble in self.babbles[:3]]
+
+        with self.assertNumQueries(1):
+            check_viewer_state(page, self.user)
+
+        self.assertEqual(
+            [(data["is_liked"], data["is_rebabbled"]) for data in page],
+            [(True, False), (False, True), (False, False)],
+        )
+
+    def test_check_viewer_state_empty_page(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(check_viewer_state([], self.user), [])
+
+
+class LocalCacheTestCase(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LocalCache(max_size=2, timeout=60)
+        cache.set(1, "a")
+        cache.set(2, "b")
+        cache.get(1)
+        cache.set(3, "c")
+
+        self.assertEqual(cache.get(1), "a")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), "c")
+
+    def test_entries_expire(self):
+        cache = LocalCache(max_size=2, timeout=0)
+        cache.set(1, "a")
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_stats(self):
+        cache = LocalCache(max_size=2, timeout=60)
+        cache.set(1, "a")
+        cache.get(1)
+        cache.get(2)
+        self.assertEqual(cache.stats()["hit_ratio"], 0.5)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def setUp(self):
+        self.connection = get_redis_connection("default")
+        self.connection.delete("lock:singleflight-test")
+
+    def test_one_caller_rebuilds(self):
+        built = []
+
+        def rebuild():
+            built.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        def read():
+            return "value" if built else None
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: single_flight(
+                        self.connection, "singleflight-test", rebuild, read, 5, 1
+                    ),
+                    range(8),
+                )
+            )
+
+        self.assertEqual(len(built), 1)
+        self.assertEqual(results, ["value"] * 8)
+
+    def test_refresh_early(self):
+        self.assertFalse(refresh_early(ttl=3600, delta=0.01))
+        self.assertTrue(refresh_early(ttl=0, delta=0.01))
+        self.assertFalse(refresh_early(ttl=0, delta=0))
+        self.assertFalse(refresh_early(ttl=-1, delta=0.01))
+
+
+class CacheStatsTestCase(SimpleTestCase):
+    def setUp(self):
+        self.connection = get_redis_connection("default")
+        self.connection.delete(STATS_KEY)
+
+    def test_keyspace_of(self):
+        self.assertEqual(keyspace_of("timeline:1"), "timeline")
+        self.assertEqual(keyspace_of("timeline:1:flags"), "flags")
+        self.assertEqual(keyspace_of("babble:1"), "babble")
+        self.assertEqual(keyspace_of(":1:views.decorators.cache"), "django")
+
+    def test_counts_ride_along_with_the_next_pipeline(self):
+        stats = KeyspaceStats()
+        stats.count("timeline", hits=3, misses=1)
+
+        pipeline = self.connection.pipeline()
+        stats.write(pipeline)
+        pipeline.execute()
+
+        self.assertEqual(
+            read_stats([self.connection]),
+            {"timeline": {"hits": 3, "misses": 1, "hit_ratio": 0.75}},
+        )
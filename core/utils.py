@@ -1,6 +1,7 @@
+import hashlib
 import os
 import uuid
-from typing import Any
+from typing import Any, Iterable
 
 from django.utils import timezone
 
@@ -19,6 +20,22 @@ def audio_file_path(instance: Any, filename: str) -> str:
     return os.path.join(filepath, filename)
 
 
+def content_hash(chunks: Iterable[bytes]) -> str:
+    sha256 = hashlib.sha256()
+    for chunk in chunks:
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return content_hash(iter(lambda: f.read(1024 * 1024), b""))
+
+
+def upload_hash(uploaded_file: Any) -> str:
+    return content_hash(uploaded_file.chunks())
+
+
 import json
 import logging
 
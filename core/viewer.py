@@ -0,0 +1,42 @@
+from typing import Dict, Iterable, List
+
+from django.db.models import CharField, Value
+
+from likes.models import Like
+from rebabbles.models import Rebabble
+from users.models import User
+
+VIEWER_FIELDS = ("is_liked", "is_rebabbled")
+
+
+def get_viewer_state(user: User, babble_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Whether ``user`` liked and rebabbled each of ``babble_ids``.
+
+    Only the given ids are looked up, in one query, so the cost depends on
+    the page size and not on how many babbles the user ever liked.
+    """
+    babble_ids = list(babble_ids)
+    state = {id: {field: False for field in VIEWER_FIELDS} for id in babble_ids}
+
+    if not babble_ids or not user.is_authenticated:
+        return state
+
+    likes = Like.objects.filter(user=user, babble_id__in=babble_ids).values_list(
+        "babble_id", Value("is_liked", output_field=CharField())
+    )
+    rebabbles = Rebabble.objects.filter(
+        user=user, babble_id__in=babble_ids
+    ).values_list("babble_id", Value("is_rebabbled", output_field=CharField()))
+
+    for babble_id, field in likes.union(rebabbles, all=True):
+        state[babble_id][field] = True
+
+    return state
+
+
+def check_viewer_state(serialized_babbles: List[Dict], user: User) -> List[Dict]:
+    state = get_viewer_state(user, [data["id"] for data in serialized_babbles])
+    for data in serialized_babbles:
+        data.update(state[data["id"]])
+
+    return serialized_babbles
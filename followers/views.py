@@ -1,19 +1,18 @@
 from typing import Optional
 
-from django.core.cache import caches
 from django.db import transaction
 from django.db.models import F
 from django.http import HttpRequest
 from rest_framework import status, viewsets
 from rest_framework.response import Response
 
+from babbles import timelines
+from babbles.utils import drop_pulled_authors
 from followers.models import Follower
 from followers.serializers import FollowerSerializer
 from notifications.utils import send_message_to_user
 from users.models import User
 
-user_cache = caches["default"]
-
 
 class FollowerViewSet(viewsets.ViewSet):
     queryset = Follower.objects.all()
@@ -29,7 +28,7 @@ class FollowerViewSet(viewsets.ViewSet):
             following_count=F("following_count") + 1
         )
         User.objects.filter(id=user_id).update(follower_count=F("follower_count") + 1)
-        user_cache.delete(request.user.id)
+        timelines.delete(request.user.id)
 
         send_message_to_user(
             request.user.id, user_id, f"{request.user.username} followed you"
@@ -45,6 +44,7 @@ class FollowerViewSet(viewsets.ViewSet):
         User.objects.filter(id=request.user.id).update(
             following_count=F("following_count") - 1
         )
-        user_cache.delete(request.user.id)
+        timelines.delete(request.user.id)
+        drop_pulled_authors([user_id])
 
         return Response(status=status.HTTP_200_OK)
@@ -12,5 +12,9 @@ class Like(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     objects = DefaultManager()
 
+    class Meta:
+        # Viewer state looks up one user's rows for a page of babble ids.
+        indexes = [models.Index(fields=["user", "babble"])]
+
     def __str__(self):
         return self.user.first_name + " likes " + str(self.babble.id)
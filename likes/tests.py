@@ -1,15 +1,23 @@
+from django.core.cache import caches
+from django.db.models import F
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
-from babbles.models import Babble
+from babbles import babble_cache, counters
+from babbles.models import Babble, CounterFlush
 from likes.models import Like
 from users.models import User
 
 
 class LikeViewSetTestCase(APITestCase):
     def setUp(self):
+        # Pending counts and cached babbles of reused babble ids must not
+        # leak between tests.
+        caches["default"].clear()
+        babble_cache.clear()
         self.user1 = User.objects.create_user(
             username="user1", password="user1_password"
         )
@@ -21,23 +29,77 @@ class LikeViewSetTestCase(APITestCase):
         )
 
     def test_create_like(self):
-        response = self.client.post(reverse("likes", args=[self.babble.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("likes", args=[self.babble.id]))
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertTrue(
             Like.objects.filter(user=self.user1, babble=self.babble).exists()
         )
+        counters.flush()
+        self.babble.refresh_from_db()
+        self.assertEqual(self.babble.like_count, 1)
+
+    def test_pending_like_count_is_read_before_flush(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("likes", args=[self.babble.id]))
+
+        response = self.client.get(reverse("babbles-detail", args=[self.babble.id]))
+        self.assertEqual(response.data["like_count"], 1)
+        self.babble.refresh_from_db()
+        self.assertEqual(self.babble.like_count, 0)
+
+        self.assertEqual(counters.flush(), 1)
+        self.assertEqual(counters.pending([self.babble.id]), {})
+        response = self.client.get(reverse("babbles-detail", args=[self.babble.id]))
+        self.assertEqual(response.data["like_count"], 1)
+
+    @override_settings(COUNTER_CLAIM_TIMEOUT=-1)
+    def test_claimed_counts_are_written_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("likes", args=[self.babble.id]))
+
+        # The flusher dies after claiming, before writing.
+        counters.claim("crashed", [self.babble.id])
+        self.assertEqual(
+            counters.pending([self.babble.id]), {self.babble.id: {"like_count": 1}}
+        )
+        counters.flush()
         self.babble.refresh_from_db()
         self.assertEqual(self.babble.like_count, 1)
 
+        # Now it dies after committing, before dropping its claim.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse("likes", args=[self.babble.id]))
+        counters.claim("committed", [self.babble.id])
+        CounterFlush.objects.create(token="committed")
+        Babble.objects.filter(id=self.babble.id).update(like_count=F("like_count") - 1)
+        counters.flush()
+        self.babble.refresh_from_db()
+        self.assertEqual(self.babble.like_count, 0)
+        self.assertEqual(counters.pending([self.babble.id]), {})
+
+    def test_flush_drops_cached_counts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("likes", args=[self.babble.id]))
+        self.client.get(reverse("babbles-detail", args=[self.babble.id]))
+
+        counters.flush()
+
+        self.assertIsNone(babble_cache.get(self.babble.id))
+        response = self.client.get(reverse("babbles-detail", args=[self.babble.id]))
+        self.assertEqual(response.data["like_count"], 1)
+
     def test_destroy_like(self):
         Like.objects.create(user=self.user1, babble=self.babble)
         self.babble.like_count = 1
         self.babble.save()
-        response = self.client.delete(reverse("likes", args=[self.babble.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("likes", args=[self.babble.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertFalse(
             Like.objects.filter(user=self.user1, babble=self.babble).exists()
         )
+        counters.flush()
         self.babble.refresh_from_db()
         self.assertEqual(self.babble.like_count, 0)
 
@@ -1,32 +1,26 @@
 import logging
 from typing import Optional
 
-from django.core.cache import caches
 from django.db import transaction
-from django.db.models import F
 from django.http import Http404, HttpRequest
 from rest_framework import status, viewsets
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from babbles import counters
 from babbles.models import Babble
 from babbles.serializers import BabbleSerializer
+from core.viewer import check_viewer_state
 from likes.models import Like
 from likes.serializers import LikeSerializer
 from likes.utils import (
-    check_liked,
-    check_rebabbled,
     get_user,
-    update_babble_cache,
     update_user_cache,
 )
 from notifications.utils import send_message_to_user
 
 logger = logging.getLogger(__name__)
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-
 
 class LikeViewSet(viewsets.ViewSet):
     queryset = Like.objects.all()
@@ -39,11 +33,9 @@ class LikeViewSet(viewsets.ViewSet):
         serializer.save(babble_id=babble_id, user=request.user)
 
         babble = Babble.objects.get(id=babble_id)
-        babble.like_count += 1
-        babble.save()
+        counters.incr_on_commit(babble.id, "like_count", 1)
 
         update_user_cache(request.user.id, babble_id, "is_liked", True)
-        update_babble_cache(babble_id, "like_count", 1)
 
         send_message_to_user(
             request.user.id,
@@ -61,11 +53,11 @@ class LikeViewSet(viewsets.ViewSet):
     ) -> Response:
         babble_id = int(babble_id)
 
-        Babble.objects.filter(id=babble_id).update(like_count=F("like_count") - 1)
-        Like.objects.filter(user=request.user, babble=babble_id).delete()
+        deleted, _ = Like.objects.filter(user=request.user, babble=babble_id).delete()
+        if deleted:
+            counters.incr_on_commit(babble_id, "like_count", -1)
 
         update_user_cache(request.user.id, babble_id, "is_liked", False)
-        update_babble_cache(babble_id, "like_count", -1)
 
         return Response(status=status.HTTP_200_OK)
 
@@ -80,7 +72,8 @@ class LikeViewSet(viewsets.ViewSet):
             raise Http404
 
         serializer = BabbleSerializer(query, many=True)
-        serialized_data = check_rebabbled(serializer.data, request.user)
-        serialized_data = check_liked(serialized_data, request.user)
+        serialized_data = counters.apply(
+            check_viewer_state(serializer.data, request.user)
+        )
 
         return pagenator.get_paginated_response(serialized_data)
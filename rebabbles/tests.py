@@ -1,8 +1,10 @@
+from django.core.cache import caches
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from babbles import counters
 from babbles.models import Babble
 from rebabbles.models import Rebabble
 from users.models import User
@@ -10,6 +12,8 @@ from users.models import User
 
 class RebabbleViewSetTestCase(APITestCase):
     def setUp(self):
+        # Pending counts of reused babble ids must not leak between tests.
+        caches["default"].clear()
         self.client = APIClient()
         self.user1 = User.objects.create_user(
             username="user1", password="user1_password"
@@ -19,9 +23,11 @@ class RebabbleViewSetTestCase(APITestCase):
         self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.token}")
 
     def test_create_rebabble(self):
-        response = self.client.post(reverse("rebabbles", args=[self.babble.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("rebabbles", args=[self.babble.id]))
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Rebabble.objects.count(), 1)
+        counters.flush()
         self.babble.refresh_from_db()
         self.assertEqual(self.babble.rebabble_count, 1)
 
@@ -29,9 +35,11 @@ class RebabbleViewSetTestCase(APITestCase):
         Rebabble.objects.create(user=self.user1, babble=self.babble)
         self.babble.rebabble_count = 1
         self.babble.save()
-        response = self.client.delete(reverse("rebabbles", args=[self.babble.id]))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("rebabbles", args=[self.babble.id]))
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(Rebabble.objects.count(), 0)
+        counters.flush()
         self.babble.refresh_from_db()
         self.assertEqual(self.babble.rebabble_count, 0)
 
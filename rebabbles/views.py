@@ -1,29 +1,23 @@
 from typing import Optional
 
-from django.core.cache import caches
 from django.db import transaction
-from django.db.models import F
 from django.http import Http404, HttpRequest
 from rest_framework import status, viewsets
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from babbles import counters
 from babbles.models import Babble
 from babbles.serializers import BabbleSerializer
+from core.viewer import check_viewer_state
 from notifications.utils import send_message_to_user
 from rebabbles.models import Rebabble
 from rebabbles.serializers import RebabbleSerializer
 from rebabbles.utils import (
-    check_liked,
-    check_rebabbled,
     get_user,
-    update_babble_cache,
     update_user_cache,
 )
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-
 
 class RebabbleViewSet(viewsets.ViewSet):
     queryset = Rebabble.objects.all()
@@ -35,11 +29,9 @@ class RebabbleViewSet(viewsets.ViewSet):
 
         Rebabble.objects.create(user=request.user, babble=babble)
 
-        babble.rebabble_count += 1
-        babble.save()
+        counters.incr_on_commit(babble.id, "rebabble_count", 1)
 
         update_user_cache(request.user.id, babble_id, "is_rebabbled", True)
-        update_babble_cache(babble_id, "rebabble_count", 1)
 
         send_message_to_user(
             request.user.id,
@@ -54,13 +46,13 @@ class RebabbleViewSet(viewsets.ViewSet):
         self, request: HttpRequest, babble_id: Optional[str] = None
     ) -> Response:
         babble_id = int(babble_id)
-        Rebabble.objects.filter(user=request.user, babble=babble_id).delete()
-        Babble.objects.filter(id=babble_id).update(
-            rebabble_count=F("rebabble_count") - 1
-        )
+        deleted, _ = Rebabble.objects.filter(
+            user=request.user, babble=babble_id
+        ).delete()
+        if deleted:
+            counters.incr_on_commit(babble_id, "rebabble_count", -1)
 
         update_user_cache(request.user.id, babble_id, "is_rebabbled", False)
-        update_babble_cache(babble_id, "rebabble_count", -1)
 
         return Response(status=status.HTTP_200_OK)
 
@@ -74,7 +66,8 @@ class RebabbleViewSet(viewsets.ViewSet):
             raise Http404
 
         serializer = BabbleSerializer(query, many=True)
-        serialized_data = check_rebabbled(serializer.data, request.user)
-        serialized_data = check_liked(serialized_data, request.user)
+        serialized_data = counters.apply(
+            check_viewer_state(serializer.data, request.user)
+        )
 
         return pagenator.get_paginated_response(serialized_data)
@@ -5,11 +5,12 @@ from rest_framework import viewsets
 from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 
+from babbles import counters
 from babbles.models import Babble
 from babbles.serializers import BabbleSerializer
+from core.viewer import check_viewer_state
 from tags.models import Tag
 from tags.serializers import TagSerializer
-from tags.utils import check_liked, check_rebabbled
 
 
 class TagViewSet(viewsets.ViewSet):
@@ -26,7 +27,8 @@ class TagViewSet(viewsets.ViewSet):
             raise Http404
 
         serializer = BabbleSerializer(query, many=True)
-        serialized_data = check_rebabbled(serializer.data, request.user)
-        serialized_data = check_liked(serialized_data, request.user)
+        serialized_data = counters.apply(
+            check_viewer_state(serializer.data, request.user)
+        )
 
         return pagenator.get_paginated_response(serialized_data)
@@ -0,0 +1,6 @@
+from django.contrib import admin
+
+from uploads.models import Upload
+
+# Register your models here.
+admin.site.register(Upload)
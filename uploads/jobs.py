@@ -0,0 +1,40 @@
+import logging
+from typing import Dict
+
+from core.scheduler import SchedulerFull, SchedulerTimeout
+from core.stt import get_stt
+from uploads.models import Upload
+
+logger = logging.getLogger(__name__)
+
+
+def transcribe_segments(job: Dict) -> None:
+    """Transcribe the finished sentences of an upload that is still arriving."""
+    upload = Upload.objects.filter(id=job["upload_id"], status=Upload.UPLOADING).first()
+
+    # Finished uploads are picked up by the babble's own transcription job.
+    if upload is None:
+        return
+
+    try:
+        text, offset = get_stt().transcribe_closed(
+            upload.audio.path, upload.transcribed_seconds
+        )
+    except (SchedulerFull, SchedulerTimeout):
+        # Skipped rather than requeued: the next chunk queues another pass.
+        return
+    except Exception:
+        logger.exception({"upload_id": upload.id, "message": "segment failed"})
+        return
+
+    if not text:
+        return
+
+    # Two passes can overlap; only the one that started from the stored
+    # offset may extend the transcript.
+    Upload.objects.filter(
+        id=upload.id, transcribed_seconds=upload.transcribed_seconds
+    ).update(
+        transcript=" ".join(part for part in (upload.transcript, text) if part),
+        transcribed_seconds=offset,
+    )
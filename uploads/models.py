@@ -0,0 +1,45 @@
+from django.db import models
+
+from babbles.models import Babble
+from comments.models import Comment
+from core.managers import DefaultManager
+from core.utils import audio_file_path
+from users.models import User
+
+
+class Upload(models.Model):
+    BABBLE = "babble"
+    COMMENT = "comment"
+    KIND_CHOICES = (
+        (BABBLE, "Babble"),
+        (COMMENT, "Comment"),
+    )
+
+    UPLOADING = "uploading"
+    COMPLETE = "complete"
+    STATUS_CHOICES = (
+        (UPLOADING, "Uploading"),
+        (COMPLETE, "Complete"),
+    )
+
+    id = models.BigAutoField(primary_key=True, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # The babble a comment is for, or the babble a finished upload created.
+    babble = models.ForeignKey(Babble, on_delete=models.CASCADE, blank=True, null=True)
+    comment = models.ForeignKey(
+        Comment, on_delete=models.SET_NULL, blank=True, null=True
+    )
+    audio = models.FileField(upload_to=audio_file_path, blank=True)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=UPLOADING)
+    # Speech transcribed while the rest of the file was still arriving.
+    transcript = models.TextField(blank=True)
+    transcribed_seconds = models.FloatField(default=0.0)
+    created = models.DateTimeField(auto_now_add=True)
+    modified = models.DateTimeField(auto_now=True)
+    objects = DefaultManager()
+
+    def __str__(self):
+        return f"{self.kind} upload {self.id}"
@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework.serializers import ModelSerializer, ValidationError
+
+from uploads.models import Upload
+
+
+class UploadSerializer(ModelSerializer):
+    class Meta:
+        model = Upload
+        fields = ("id", "kind", "babble", "comment", "size", "offset", "status")
+        read_only_fields = ("comment", "offset", "status")
+
+    def validate_size(self, size: int) -> int:
+        if not 0 < size <= settings.UPLOAD_MAX_SIZE:
+            raise ValidationError(
+                f"size must be between 1 and {settings.UPLOAD_MAX_SIZE} bytes."
+            )
+        return size
+
+    def validate(self, data: dict) -> dict:
+        if data["kind"] == Upload.COMMENT and not data.get("babble"):
+            raise ValidationError({"babble": "A comment upload needs a babble."})
+        if data["kind"] == Upload.BABBLE and data.get("babble"):
+            raise ValidationError({"babble": "A babble upload creates its babble."})
+        return data
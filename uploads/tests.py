@@ -0,0 +1,136 @@
+import io
+import wave
+
+import numpy as np
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from babbles import counters
+from babbles.models import Babble
+from comments.models import Comment
+from core import stt
+from core.audio import SAMPLE_RATE
+from core.engines import FakeEngine
+from uploads.jobs import transcribe_segments
+from uploads.models import Upload
+from users.models import User
+
+
+class UploadViewSetTestCase(APITestCase):
+    def setUp(self):
+        # Pending counts of reused babble ids must not leak between tests.
+        caches["default"].clear()
+        self.user1 = User.objects.create_user(
+            username="user1", password="user1_password"
+        )
+        with open("test.mp3", "rb") as f:
+            self.content = f.read()
+
+        self.upload_url = reverse("uploads-list")
+
+        self.user1_token = RefreshToken.for_user(self.user1)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {self.user1_token.access_token}"
+        )
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.generic(
+            "PATCH",
+            reverse("uploads-detail", kwargs={"pk": upload_id}),
+            chunk,
+            content_type="application/offset+octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_babble_upload(self):
+        response = self.client.post(
+            self.upload_url, {"kind": "babble", "size": len(self.content)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        upload_id = response.data["id"]
+        half = len(self.content) // 2
+
+        response = self.send_chunk(upload_id, 0, self.content[:half])
+        self.assertEqual(response.data["offset"], half)
+        self.assertEqual(response.data["status"], Upload.UPLOADING)
+
+        response = self.send_chunk(upload_id, half, self.content[half:])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Upload.COMPLETE)
+
+        babble = Babble.objects.get(id=response.data["babble"])
+        self.assertEqual(babble.status, Babble.PROCESSING)
+        with babble.audio.open("rb") as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_segments_are_transcribed_while_uploading(self):
+        stt._stt = stt.STT(FakeEngine(transcript="공원"))
+        self.addCleanup(setattr, stt, "_stt", None)
+
+        # Four one second sentences, each followed by a second of silence.
+        tone = np.sin(2 * np.pi * 220 * np.arange(SAMPLE_RATE) / SAMPLE_RATE)
+        sentence = np.concatenate([0.5 * tone, np.zeros(SAMPLE_RATE)])
+        samples = (np.tile(sentence, 4) * 32767).astype(np.int16)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(SAMPLE_RATE)
+            f.writeframes(samples.tobytes())
+        content = buffer.getvalue()
+
+        response = self.client.post(
+            self.upload_url, {"kind": "babble", "size": len(content)}
+        )
+        upload_id = response.data["id"]
+        header = len(content) - samples.nbytes
+        sentence_bytes = len(sentence) * 2
+
+        offset = 0
+        for count in range(1, 4):
+            end = header + count * sentence_bytes
+            self.send_chunk(upload_id, offset, content[offset:end])
+            offset = end
+            transcribe_segments({"upload_id": upload_id})
+
+            upload = Upload.objects.get(id=upload_id)
+            self.assertEqual(upload.transcript, " ".join(["공원"] * count))
+            self.assertGreater(upload.transcribed_seconds, 2 * count - 1)
+            self.assertLess(upload.transcribed_seconds, 2 * count)
+
+    def test_chunk_at_wrong_offset(self):
+        response = self.client.post(
+            self.upload_url, {"kind": "babble", "size": len(self.content)}
+        )
+        upload_id = response.data["id"]
+
+        response = self.send_chunk(upload_id, 10, self.content[10:20])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = self.client.get(reverse("uploads-detail", kwargs={"pk": upload_id}))
+        self.assertEqual(response["Upload-Offset"], "0")
+
+    def test_chunked_comment_upload(self):
+        babble = Babble.objects.create(user=self.user1)
+        response = self.client.post(
+            self.upload_url,
+            {"kind": "comment", "babble": babble.id, "size": len(self.content)},
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.send_chunk(response.data["id"], 0, self.content)
+
+        self.assertEqual(response.data["status"], Upload.COMPLETE)
+        self.assertTrue(Comment.objects.filter(id=response.data["comment"]).exists())
+        counters.flush()
+        babble.refresh_from_db()
+        self.assertEqual(babble.comment_count, 1)
+
+    def test_comment_upload_needs_babble(self):
+        response = self.client.post(
+            self.upload_url, {"kind": "comment", "size": len(self.content)}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
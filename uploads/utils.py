@@ -0,0 +1,94 @@
+import time
+from typing import IO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+
+from babbles import counters
+from babbles.jobs import enqueue_transcription, job_score
+from babbles.models import Babble
+from babbles.serializers import BabbleSerializer
+from babbles.utils import set_caches
+from comments.models import Comment
+from core.queues import get_queue
+from core.utils import audio_file_path
+from notifications.utils import send_message_to_followers, send_message_to_user
+from uploads.models import Upload
+from users.models import User
+
+READ_SIZE = 64 * 1024
+
+
+def start_upload(upload: Upload) -> Upload:
+    storage = upload.audio.storage
+    upload.audio.name = storage.save(audio_file_path(upload, ""), ContentFile(b""))
+    upload.save(update_fields=["audio"])
+    return upload
+
+
+def append_chunk(upload: Upload, stream: IO[bytes], length: int) -> Upload:
+    """Copy ``length`` bytes from the request into the file, a piece at a
+    time, so a chunk is never held in memory whole."""
+    with upload.audio.storage.open(upload.audio.name, "r+b") as f:
+        # Drops the tail of an earlier chunk that broke off half way.
+        f.seek(upload.offset)
+        f.truncate()
+
+        remaining = length
+        while remaining > 0:
+            piece = stream.read(min(READ_SIZE, remaining))
+            if not piece:
+                break
+            f.write(piece)
+            remaining -= len(piece)
+
+    upload.offset += length - remaining
+    upload.save(update_fields=["offset", "modified"])
+    return upload
+
+
+def queue_segment_transcription(upload: Upload) -> None:
+    # Highest priority: these jobs are what make tags ready at upload end.
+    job = {"upload_id": upload.id}
+    transaction.on_commit(
+        lambda: get_queue().push(job, score=job_score(0, time.time()))
+    )
+
+
+def complete_babble_upload(upload: Upload, user: User) -> Babble:
+    babble = Babble.objects.create(
+        user=user, audio=upload.audio.name, status=Babble.PROCESSING
+    )
+    enqueue_transcription(babble, upload=upload)
+    set_caches(babble, user, BabbleSerializer(babble).data)
+
+    send_message_to_followers(user, f"{user.username} babbled {babble.id}.")
+
+    upload.babble = babble
+    return babble
+
+
+def complete_comment_upload(upload: Upload, user: User) -> Comment:
+    babble = upload.babble
+    comment = Comment.objects.create(user=user, babble=babble, audio=upload.audio.name)
+    counters.incr_on_commit(babble.id, "comment_count", 1)
+
+    send_message_to_user(
+        user.id,
+        babble.user.id,
+        f"{user.username} commented on your babble {babble.id}.",
+    )
+
+    upload.comment = comment
+    return comment
+
+
+def complete_upload(upload: Upload, user: User) -> Upload:
+    if upload.kind == Upload.BABBLE:
+        complete_babble_upload(upload, user)
+    else:
+        complete_comment_upload(upload, user)
+
+    upload.status = Upload.COMPLETE
+    upload.save(update_fields=["babble", "comment", "status", "modified"])
+    return upload
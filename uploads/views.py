@@ -0,0 +1,86 @@
+from typing import Optional
+
+from django.db import transaction
+from django.http import Http404, HttpRequest
+from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from babbles.jobs import check_queue_capacity
+from core.exceptions import OffsetMismatch
+from uploads.models import Upload
+from uploads.serializers import UploadSerializer
+from uploads.utils import (
+    append_chunk,
+    complete_upload,
+    queue_segment_transcription,
+    start_upload,
+)
+
+
+class UploadViewSet(viewsets.ViewSet):
+    """Resumable audio uploads for babbles and comments.
+
+    POST declares the kind and total size. Each PATCH sends the next bytes
+    as a raw body with an ``Upload-Offset`` header, and GET tells a client
+    where to resume. The babble or comment is created with the last chunk.
+    """
+
+    queryset = Upload.objects.all()
+    serializer_class = UploadSerializer
+
+    def create(self, request: HttpRequest) -> Response:
+        serializer = UploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data["kind"] == Upload.BABBLE:
+            check_queue_capacity()
+
+        upload = start_upload(serializer.save(user=request.user))
+
+        return Response(UploadSerializer(upload).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request: HttpRequest, pk: Optional[str] = None) -> Response:
+        upload = Upload.objects.get_or_404(id=pk, user=request.user)
+
+        return Response(
+            UploadSerializer(upload).data,
+            status=status.HTTP_200_OK,
+            headers={"Upload-Offset": str(upload.offset)},
+        )
+
+    @transaction.atomic
+    def partial_update(
+        self, request: HttpRequest, pk: Optional[str] = None
+    ) -> Response:
+        upload = (
+            Upload.objects.select_for_update().filter(id=pk, user=request.user).first()
+        )
+        if upload is None:
+            raise Http404
+
+        try:
+            offset = int(request.headers["Upload-Offset"])
+            length = int(request.headers.get("Content-Length") or 0)
+        except (KeyError, ValueError):
+            raise ValidationError("Upload-Offset and Content-Length are required.")
+
+        if upload.status == Upload.COMPLETE or offset != upload.offset:
+            raise OffsetMismatch(f"Resume at offset {upload.offset}.")
+        if offset + length > upload.size:
+            raise ValidationError("The chunk runs past the declared size.")
+
+        # The body is read from the stream; touching request.data would
+        # buffer it.
+        if length:
+            upload = append_chunk(upload, request.stream, length)
+
+        if upload.offset == upload.size:
+            upload = complete_upload(upload, request.user)
+        elif upload.kind == Upload.BABBLE:
+            queue_segment_transcription(upload)
+
+        return Response(
+            UploadSerializer(upload).data,
+            status=status.HTTP_200_OK,
+            headers={"Upload-Offset": str(upload.offset)},
+        )
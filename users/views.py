@@ -2,7 +2,6 @@ from typing import Optional
 
 from django.contrib.auth import authenticate
 from django.contrib.auth.hashers import make_password
-from django.core.cache import caches
 from django.db import transaction
 from django.db.models import F
 from django.http import HttpRequest
@@ -10,14 +9,13 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from babbles import babble_cache, timelines
 from babbles.models import Babble
+from babbles.utils import drop_pulled_authors
 from users.models import User
 from users.serializers import UserSerializer
 from users.utils import check_is_following, get_user
 
-user_cache = caches["default"]
-babble_cache = caches["second"]
-
 
 class UserViewSet(viewsets.ViewSet):
     queryset = User.objects.all()
@@ -51,14 +49,18 @@ class UserViewSet(viewsets.ViewSet):
         User.objects.filter(self__following=user).update(
             follower_count=F("follower_count") - 1
         )
+        drop_pulled_authors(
+            User.objects.filter(self__following=user).values_list("id", flat=True)
+        )
         User.objects.filter(following__user=user).update(
             following_count=F("following_count") - 1
         )
 
-        user_cache.delete(user.id)
+        timelines.delete(user.id)
 
-        for babble in Babble.objects.filter(user=user):
-            babble_cache.delete(babble.id)
+        babble_cache.delete_many(
+            list(Babble.objects.filter(user=user).values_list("id", flat=True))
+        )
 
         user.delete()
 